@@ -1,85 +1,95 @@
-from selenium.webdriver.common.action_chains import ActionChains
-from appium import webdriver
-from appium.options.ios import XCUITestOptions
+import copy
+import logging
 import time
-from context import set_context, get_context
-from board_detection import *
-from block_detection import *
-from placement import *
-import traceback
-
-def get_offset_from_counter(counter):
-    x_range = list(range(-50, 50, 10))  # e.g., [-50, -45, ..., 45]
-    y_range = list(range(50, -50, -10))  # e.g., [25, 30, ..., 115]
-
-    if counter == 0:
-        return 0, 0  # First attempt: no offset
-    counter -= 1  # Adjust for 0,0 being used already
-
-    if counter >= len(x_range) * len(y_range):
-        return None, None  # All combinations exhausted
-
-    y_idx = counter // len(x_range)  # y loop outside
-    x_idx = counter % len(x_range)   # x loop inside
-
-    x_offset = x_range[x_idx]
-    y_offset = y_range[y_idx]
-
-    return x_offset, y_offset
-
-def compute_target_pixel(shape, board_origin, cell_size, place_row, place_col):
+from calibration import apply_geometry
+from context import current_session, get_context
+from drop_calibration import load_drop_table
+from board_detection import get_current_board
+from block_detection import get_block_shapes
+from placement import plan_greedy
+from recorder import make_recorder
+from frame_capture import capture_frame
+from frame_stability import FrameStabilityDetector, CHANGED, UNCHANGED
+from gestures import GestureBatcher
+from screen_state import ALL_POPUP_TAPS, IN_GAME, STATE_TAPS, UNKNOWN, build_screen_index
+from shape_registry import flush_registry, load_registry
+from evaluation import configure_evaluation, make_leaf_eval
+from solver import default_leaf_eval, solve_tray_parallel, start_solver_pool
+import telemetry
+from telemetry import start_tracer, stop_tracer
+
+logger = logging.getLogger("auto_ios")
+
+APPIUM_SERVER_URL = "http://localhost:4723"  # Default Appium server address
+
+def compute_target_pixel(shape, place_row, place_col, cfg=None):
+    """Where to release a drag so shape lands with its top-left cell at (place_row, place_col)."""
+    cfg = cfg or get_context()
+    cell_size, spacing, step = cfg.block_size_on_board, cfg.drag_cell_spacing, cfg.drag_size_step
     shape_row, shape_col = len(shape), len(shape[0])
 
-    shape_final_width = (shape_col * cell_size + (shape_col - 1) * 15) / 2 + (5 - shape_col) * 2
-    shape_final_height = (shape_row + 1) * cell_size + shape_row * 15 + (5 - shape_row) * 2 if shape_row < 4 else (shape_row + 0.5) * cell_size + shape_row * 15
+    shape_final_width = (shape_col * cell_size + (shape_col - 1) * spacing) / 2 + (5 - shape_col) * step
+    shape_final_height = (shape_row + 1) * cell_size + shape_row * spacing + (5 - shape_row) * step if shape_row < 4 else (shape_row + 0.5) * cell_size + shape_row * spacing
 
-    board_target_x = board_origin[0] + place_col * cell_size + place_col
-    board_target_y = board_origin[1] + place_row * cell_size + place_row
+    pitch = cell_size + cfg.drop_grid_gap
+    board_target_x = cfg.board_top_left[0] + place_col * pitch
+    board_target_y = cfg.board_top_left[1] + place_row * pitch
 
     pixel_x = board_target_x + shape_final_width
     pixel_y = board_target_y + shape_final_height
     return pixel_x, pixel_y
 
-def setup_board_shape(retry=0, max_retries=500, delay=0.5):
-    try:
-        time.sleep(delay * (retry // 5))
-        print(f"[setup_board_shape] Attempt #{retry+1}")
-        driver.save_screenshot(get_context().current_screen_template_path)
-        board, threshold = get_current_board(get_context().current_screen_template_path)
-        shapes = get_block_shapes(get_context().current_screen_template_path)
-        return board, shapes
-    except Exception as e:
-        print(f"[setup_board_shape] Failed attempt #{retry+1}: {e}")
-        traceback.print_exc()
-        if retry >= max_retries:
-            print(f"[setup_board_shape] Giving up after {max_retries} retries.")
-            return None
-        return setup_board_shape(retry + 1, max_retries, delay)
-
-def click_on_pos(coord):
-    x, y = coord
-    iphone_scale = get_context().scale
-    actions = ActionChains(driver)
-    actions.w3c_actions.pointer_action.move_to_location(x / iphone_scale, y / iphone_scale)  # Move to start
-    actions.w3c_actions.pointer_action.pointer_down()  # Press down
-    actions.w3c_actions.pointer_action.pointer_up()  # Release
-    actions.perform()
-
-def move_to_pos(from_coord, to_coord):
-    from_x, from_y = from_coord
-    to_x, to_y = to_coord
-    iphone_scale = get_context().scale
-    actions = ActionChains(driver)
-    actions.w3c_actions.pointer_action.move_to_location(from_x / iphone_scale, from_y / iphone_scale)  # Move to start
-    actions.w3c_actions.pointer_action.pointer_down()  # Press down
-    #actions.w3c_actions.pointer_action.pause(0.2)  # Small pause for realistic press
-    actions.w3c_actions.pointer_action.move_to_location(to_x / iphone_scale, to_y / iphone_scale)  # Move while pressed
-    actions.w3c_actions.pointer_action.pause(0.5)
-    actions.w3c_actions.pointer_action.pointer_up()  # Release
-    actions.perform()
-
-def is_board_updated_np(original, updated):
-    return not np.array_equal(np.array(original), np.array(updated))
+def setup_board_shape(stability, time_budget=60.0, poll_interval=0.05, device=None, frame=None):
+    """
+    Capture frames until the board and tray stop changing, then detect once.
+    Detection is skipped when the screen matches the last decision.
+    A frame already captured by the caller is used for the first attempt.
+    Returns (board, shapes) or None once time_budget seconds have passed.
+    """
+    deadline = time.monotonic() + time_budget
+    attempt = 0
+    while time.monotonic() < deadline:
+        attempt += 1
+        try:
+            logger.debug("Attempt #%d", attempt)
+            telemetry.record("setup_attempts", attempt)
+            current = frame if frame is not None else capture_frame(device or current_session().driver)
+            frame = None
+            state = stability.update(current)
+            if state == UNCHANGED and stability.decision_result is not None:
+                logger.debug("Screen unchanged since last decision, reusing detection")
+                telemetry.count("detections_reused")
+                board, shapes = stability.decision_result
+                return copy.deepcopy(board), copy.deepcopy(shapes)
+            if state == CHANGED:
+                time.sleep(poll_interval)
+                continue
+            with telemetry.span("board_detection"):
+                board, threshold = get_current_board(current)
+            if threshold is not None:
+                telemetry.record("board_threshold", float(threshold))
+            with telemetry.span("block_detection"):
+                shapes = get_block_shapes(current)
+            telemetry.record("tray_shapes", len(shapes))
+            stability.mark_decision((copy.deepcopy(board), copy.deepcopy(shapes)), current)
+            return board, shapes
+        except Exception as e:
+            logger.warning("Failed attempt #%d: %s", attempt, e, exc_info=True)
+            telemetry.count("setup_failures")
+            time.sleep(poll_interval)
+    logger.warning("Giving up after %ss (%d attempts).", time_budget, attempt)
+    telemetry.count("setup_timeouts")
+    return None
+
+def make_gestures(device=None):
+    cfg = get_context()
+    return GestureBatcher(device or current_session().driver, cfg.scale, cfg.tap_pause, cfg.drag_pause, cfg.gesture_gap)
+
+def click_on_pos(coord, device=None):
+    make_gestures(device).tap(coord).flush()
+
+def move_to_pos(from_coord, to_coord, device=None):
+    make_gestures(device).drag(from_coord, to_coord).flush()
 
 def get_tap_pos(shape_index):
     tap_pos = get_context().start_blocks
@@ -90,103 +100,191 @@ def get_tap_pos(shape_index):
     else:
         return tap_pos[2]
 
-def auto_play(driver):
-    last_board = None
-    count = 0
-    cfg = get_context()
-    while True:
-        app_info = driver.execute_script("mobile: activeAppInfo")
-        if app_info["bundleId"] != 'com.puzzle.sea.block1010':
-            print("⚠️ Not in the game, switching back...")
-            driver.activate_app("com.puzzle.sea.block1010")
-
-        print("----- LOOP START -----")
-
-        # close adds
-        click_on_pos(cfg.pop_up_high_close)
-        click_on_pos(cfg.pop_up_low_close)
-
-        # click next/no thanks
-        click_on_pos(cfg.start_game_button)
-        click_on_pos(cfg.more_score_wheel_no_thanks_button)
-        click_on_pos(cfg.diamond_no_thanks_button)
-        click_on_pos(cfg.diamond_next_button)
-        click_on_pos(cfg.no_thanks_daily)
-        click_on_pos(cfg.level_up_next_button)
-
-        board, shapes = setup_board_shape()
-
-        if len(shapes) > 4:
-            continue
-
-        offset_x = 0
-        offset_y = 0
-        if not is_board_updated_np(last_board, board):
-            offset_x, offset_y = get_offset_from_counter(count)
-            count += 1
-        else:
-            count = 0
-        last_board = board
-
-        while shapes:
-            board, shape_idx, shape_loc, pos = smart_place_best_shape(board, shapes)
-            if shape_idx is None or offset_x is None or offset_y is None:
-                break  # stop when no shapes can be placed
-            from_x, from_y = get_tap_pos(shape_loc)
-            print(f"up_b: {board}, pos: {pos}")
-
-            to_x, to_y = compute_target_pixel(shapes[shape_idx][0], get_context().board_top_left, get_context().block_size_on_board, pos[0], pos[1])
-            print(f"to_x: {to_x} with offset {offset_x}, to_y: {to_y} with offset {offset_y}")
-
-            move_to_pos((from_x, from_y), (to_x + offset_x, to_y + offset_y))
-            print(f"moved to ({to_x + offset_x}, {to_y + offset_y}).")
-            del shapes[shape_idx]  # remove the used shape
-
-
-            # test_data = cv2.imread("test_1.png")
-            # dot_color = (0, 0, 255)  # BGR (Red)
-            # dot_radius = 15
-            # cv2.circle(test_data, (from_x, from_y), dot_radius, dot_color, -1)
-            # cv2.circle(test_data, (int(to_x), int(to_y)), dot_radius, dot_color, -1)
-            # # Show the image with the dot
-            # cv2.imshow("Image with Dot", test_data)
-            #
-            # # Wait for any key press to continue
-            # cv2.waitKey(0)
-
-
-if __name__ == "__main__":
-    set_context(13)
-    cfg = get_context()
+def drop_shape(shape, shape_loc, pos, offset_x, offset_y, gestures):
+    """Queue the drag for one placement; the caller flushes the batch."""
+    from_x, from_y = get_tap_pos(shape_loc)
+    to_x, to_y = compute_target_pixel(shape, pos[0], pos[1])
+    gestures.drag((from_x, from_y), (to_x + offset_x, to_y + offset_y))
+    logger.debug("queued move to (%s, %s) with offset (%s, %s)", to_x + offset_x, to_y + offset_y, offset_x, offset_y)
+
+def ensure_in_game(device=None):
+    device = device or current_session().driver
+    bundle_id = get_context().bundle_id
+    with telemetry.span("app_check"):
+        app_info = device.execute_script("mobile: activeAppInfo")
+    telemetry.count("app_checks")
+    if app_info["bundleId"] != bundle_id:
+        logger.warning("⚠️ Not in the game, switching back...")
+        telemetry.count("app_restores")
+        device.activate_app(bundle_id)
+
+def dismiss_popups(cfg, gestures, state=UNKNOWN):
+    """Tap the buttons a classified screen needs; an unknown screen gets every popup button."""
+    buttons = ALL_POPUP_TAPS if state == UNKNOWN else STATE_TAPS[state]
+    for button in buttons:
+        gestures.tap(getattr(cfg, button))
+    with telemetry.span("popup_taps"):
+        gestures.flush()
+    telemetry.count("popup_taps", len(buttons))
+
+def recover_screen(cfg, gestures, device=None):
+    """App check plus a blind popup sweep, for a game screen with no tray or no move to play."""
+    telemetry.count("recoveries")
+    ensure_in_game(device)
+    dismiss_popups(cfg, gestures, UNKNOWN)
+
+def handle_screen(frame, screen_index, cfg, gestures, device=None):
+    """
+    Classify the frame and clear whatever covers the board.
+    The app check only runs when the screen is not recognised. Returns the screen state.
+    """
+    state, distance = screen_index.classify(frame)
+    logger.debug("Screen %s (distance %.1f)", state, distance)
+    telemetry.record("screen", state)
+    telemetry.record("screen_distance", distance)
+    if state == UNKNOWN:
+        ensure_in_game(device)
+    if state != IN_GAME:
+        dismiss_popups(cfg, gestures, state)
+    return state
+
+def plan_moves(board, shapes, cfg):
+    """Moves for the current tray as (shape, shape_loc, pos) in play order."""
+    if cfg.solver_mode == "lookahead":
+        evaluate, leaf_upper = default_leaf_eval, 0
+        if cfg.solver_evaluation == "heuristic":
+            evaluate, leaf_upper = make_leaf_eval()
+        moves, _ = solve_tray_parallel(board, shapes, cfg.solver_node_budget, cfg.solver_time_budget,
+                                       evaluate, leaf_upper)
+        return [(shapes[shape_idx][0], shape_loc, pos) for shape_idx, shape_loc, pos in moves]
+
+    # The greedy pass takes well under a millisecond, less than a round trip to a pool worker
+    moves = plan_greedy(board, shapes, cfg.placement_engine)
+    return [(shapes[shape_idx][0], shape_loc, pos) for shape_idx, shape_loc, pos in moves]
+
+def auto_play(session):
+    """Play on session.driver until session.stop() is called; binds the session to this thread."""
+    session.bind()
+    driver = session.driver
+    last_drops = None  # (board, [(shape, pos, offset)]) of the previous gesture batch
+    cfg = session.config
+    load_registry(cfg.shape_registry_path)
+    configure_evaluation(cfg.eval_weights)
+    stability = FrameStabilityDetector([cfg.board_roi, cfg.block_roi], cfg.stability_thumb_size,
+                                       cfg.stability_threshold, cfg.stability_settle_frames,
+                                       cfg.stability_pixel_threshold)
+    if cfg.solver_mode == "lookahead" and session.owns_solver_pool:
+        start_solver_pool(cfg.solver_workers, configure_evaluation, (cfg.eval_weights,))
+    gestures = make_gestures(driver)
+    screen_index = build_screen_index(cfg)
+    drop_table = load_drop_table(cfg)
+    tracer = start_tracer(cfg)
+    recorder = make_recorder(cfg)
+    try:
+        while not session.stopped:
+            iteration = tracer.begin()
+            session.count("loops")
+            try:
+                frames_before = stability.frames
+                logger.debug("----- LOOP START -----")
+
+                frame = capture_frame(driver)
+                screen = handle_screen(frame, screen_index, cfg, gestures, driver)
+                if screen not in (IN_GAME, UNKNOWN):
+                    session.count("popups")
+                    continue  # popup dismissed; look again before playing
+                # After a blind popup sweep the frame is stale, so capture afresh
+                if screen == UNKNOWN:
+                    frame = None
+
+                detected = setup_board_shape(stability, cfg.setup_time_budget, cfg.stability_poll_interval,
+                                             driver, frame)
+                if detected is None:
+                    continue
+                board, shapes = detected
+
+                if not shapes or len(shapes) > 4:
+                    # no playable tray: most likely a popup the screen index did not recognise
+                    recover_screen(cfg, gestures, driver)
+                    continue
+
+                if last_drops is not None:
+                    drop_table.verify(last_drops[0], last_drops[1], board)
+
+                before = copy.deepcopy(board)
+                with telemetry.span("solve"):
+                    plan = plan_moves(board, shapes, cfg)
+                if not plan:
+                    recover_screen(cfg, gestures, driver)
+                    continue
+                drops = []
+                for shape, shape_loc, pos in plan:
+                    offset_x, offset_y = drop_table.offset_for(shape, pos)
+                    drop_shape(shape, shape_loc, pos, offset_x, offset_y, gestures)
+                    drops.append((shape, pos, (offset_x, offset_y)))
+                # Drags run as one batch, so they are timed together
+                with telemetry.span("drags"):
+                    gestures.flush()
+                iteration.count("drags", len(drops))
+                session.count("drops", len(drops))
+                last_drops = (before, drops)
+                if recorder is not None:
+                    with telemetry.span("record"):
+                        recorder.add(stability.decision_frame, before, shapes, plan, iteration.stages, screen=screen)
+                # Shapes first seen by this solve are saved now, off the solve path
+                flush_registry()
+
+                # screenshots + gesture batches, plus the discarded frame and app check of a blind sweep
+                sweep = 2 if screen == UNKNOWN else 0
+                round_trips = stability.frames - frames_before + sweep + gestures.take_round_trips()
+                iteration.count("round_trips", round_trips)
+                logger.info("Appium round trips this loop: %d", round_trips)
+            finally:
+                tracer.end(iteration)
+    finally:
+        stop_tracer()
+        if recorder is not None:
+            recorder.close()
+        flush_registry()
+        session.unbind()
+
+
+def run_session(session):
+    """Run the session with the runner its config selects, after swapping in calibrated geometry."""
+    session.bind()
+    if session.config.auto_geometry:
+        apply_geometry(session, capture_frame(session.driver))
+    if session.config.runner == "pipelined":
+        from pipeline import PipelinedPlayer
+        PipelinedPlayer(session).run()
+    else:
+        auto_play(session)
 
+def connect_driver(cfg, server_url=APPIUM_SERVER_URL):
+    """Open an XCUITest session on the phone cfg describes and launch the game."""
+    # Only a real phone needs Appium, so fake and offline runs start without it
+    from appium import webdriver
+    from appium.options.ios import XCUITestOptions
     desired_capabilities = {
         "platformName": "iOS",
         "appium:deviceName": cfg.device_name,
         "appium:platformVersion": cfg.ios_version,
-        "appium:bundleId": "com.puzzle.sea.block1010",
+        "appium:bundleId": cfg.bundle_id,
         "appium:automationName": "XCUITest",
         "appium:udid": cfg.device_id,
+        # every phone driven from one host needs its own WebDriverAgent port
+        "appium:wdaLocalPort": cfg.wda_local_port,
         "appium:includeSafariInWebviews": True,
         "appium:newCommandTimeout": 3600,
         "appium:connectHardwareKeyboard": True,
         "appium:noReset": True
     }
-    appium_server_url = "http://localhost:4723"  # Default Appium server address
+    logger.info("Connecting to Appium server at %s...", server_url)
+    options = XCUITestOptions().load_capabilities(desired_capabilities)
+    return webdriver.Remote(server_url, options=options)
 
 
-    driver = None  # Initialize driver to None
-    try:
-        print(f"Connecting to Appium server at {appium_server_url}...")
-        options = XCUITestOptions().load_capabilities(desired_capabilities)
-        driver = webdriver.Remote(appium_server_url, options=options)
-        print("Appium driver initialized successfully. App launched on phone.")
-        auto_play(driver)
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        traceback.print_exc()
-    finally:
-        # --- 4. Close the session ---
-        if driver:
-            print("Quitting Appium driver session.")
-            driver.quit()
-        print("Script execution completed.")
+if __name__ == "__main__":
+    import sys
+    from cli import main
+    sys.exit(main(["play"] + sys.argv[1:]))
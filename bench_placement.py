@@ -0,0 +1,42 @@
+import random
+import timeit
+import numpy as np
+from shape_registry import PIECE_LIBRARY, get_placements
+from placement import PLACEMENT_ENGINES, find_best_placement, find_best_placement_np
+
+def random_boards(count, fill=0.45, seed=0):
+    rng = random.Random(seed)
+    return [[[1 if rng.random() < fill else 0 for _ in range(10)] for _ in range(10)] for _ in range(count)]
+
+def check_engines_agree(boards, shapes):
+    for board in boards:
+        for shape in shapes:
+            expected = find_best_placement(board, shape)
+            actual = find_best_placement_np(board, shape)
+            if expected != actual:
+                raise AssertionError(f"Engines disagree on {shape}: python={expected} numpy={actual}")
+
+def bench_engine(engine, boards, shapes, repeat=5):
+    find_placement = PLACEMENT_ENGINES[engine]
+
+    def run():
+        for board in boards:
+            for shape in shapes:
+                find_placement(board, shape)
+
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / (len(boards) * len(shapes)) * 1e6
+
+if __name__ == "__main__":
+    boards = random_boards(200)
+    shapes = PIECE_LIBRARY
+    for shape in shapes:
+        get_placements(shape)  # warm the registry so the python engine is timed steady-state
+
+    check_engines_agree(boards, shapes)
+    print(f"Engines agree on {len(boards)} boards x {len(shapes)} shapes")
+    for engine in PLACEMENT_ENGINES:
+        print(f"{engine:>8}: {bench_engine(engine, boards, shapes):8.2f} us per find_best_placement")
+    # The numpy engine pays for list -> ndarray conversion on every call; show it without that cost.
+    array_boards = [np.asarray(board, dtype=np.int32) for board in boards]
+    print(f"{'numpy*':>8}: {bench_engine('numpy', array_boards, shapes):8.2f} us per find_best_placement (ndarray boards)")
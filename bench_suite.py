@@ -0,0 +1,242 @@
+"""
+Offline benchmark of the vision and placement stages over test_data/.
+
+    python bench_suite.py                        # time every stage, check outputs, write results
+    python bench_suite.py --compare old.json     # also flag stages whose p50 got slower
+    python bench_suite.py --update-expected      # re-record bench_expected.json from current outputs
+"""
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from config import find_target
+from context import set_context, get_context
+from board_detection import get_current_board
+from block_detection import get_block_shapes
+from placement import PLACEMENT_ENGINES, smart_place_best_shape
+from shape_registry import load_registry
+
+RESULTS_VERSION = 1
+TRAY_READERS = ("sampling", "template")
+
+
+def load_frames(image_dir="test_data/"):
+    return {image_file: cv2.imread(os.path.join(image_dir, image_file))
+            for image_file in sorted(os.listdir(image_dir)) if not image_file.startswith(".")}
+
+def percentiles(samples_ns):
+    p50, p95, p99 = np.percentile(np.asarray(samples_ns, dtype=np.float64) / 1e3, [50, 95, 99])
+    return {"p50_us": round(float(p50), 2), "p95_us": round(float(p95), 2), "p99_us": round(float(p99), 2)}
+
+@contextlib.contextmanager
+def config_override(**values):
+    cfg = get_context()
+    saved = {name: getattr(cfg, name) for name in values}
+    for name, value in values.items():
+        setattr(cfg, name, value)
+    try:
+        yield cfg
+    finally:
+        for name, value in saved.items():
+            setattr(cfg, name, value)
+
+
+# --- Stages: name -> (settings, fn(frame, expected) -> output) ---
+def board_stage(frame, _):
+    board, _ = get_current_board(frame)
+    return board
+
+def tray_stage(frame, _):
+    return [[shape, int(shape_loc)] for shape, shape_loc in get_block_shapes(frame)]
+
+def make_placement_stage(engine):
+    def placement_stage(_, expected):
+        # Placement is timed on the expected detections so a vision regression can't skew it
+        board = copy.deepcopy(expected["board"])
+        shapes = [(shape, shape_loc) for shape, shape_loc in expected["shapes"]]
+        _, shape_idx, shape_loc, pos = smart_place_best_shape(board, shapes, verbose=False, engine=engine)
+        return None if shape_idx is None else [shape_idx, int(shape_loc), list(pos)]
+    return placement_stage
+
+# Reduced-resolution vision settings benched next to full resolution; outputs must not change.
+VISION_MODES = {"x3": {"vision_scale": 3, "vision_roi_only": True}}
+
+# Engines that score more than lines cleared pick differently; they get their own expected field.
+PLACEMENT_FIELDS = {"heuristic": "placement_heuristic"}
+
+def build_stages():
+    stages = {"board": ({}, board_stage, "board")}
+    for reader in TRAY_READERS:
+        stages[f"tray.{reader}"] = ({"tray_reader": reader}, tray_stage, "shapes")
+    for mode, settings in VISION_MODES.items():
+        stages[f"board.{mode}"] = (settings, board_stage, "board")
+        for reader in TRAY_READERS:
+            stages[f"tray.{reader}.{mode}"] = ({**settings, "tray_reader": reader}, tray_stage, "shapes")
+    for engine in PLACEMENT_ENGINES:
+        stages[f"placement.{engine}"] = ({}, make_placement_stage(engine), PLACEMENT_FIELDS.get(engine, "placement"))
+    return stages
+
+
+# --- Measurement ---
+def time_stage(fn, frames, expected, iterations, warmup=2):
+    samples = []
+    outputs = {}
+    for name, frame in frames.items():
+        for _ in range(warmup):
+            outputs[name] = fn(frame, expected.get(name))
+        for _ in range(iterations):
+            start = time.perf_counter_ns()
+            fn(frame, expected.get(name))
+            samples.append(time.perf_counter_ns() - start)
+    return samples, outputs
+
+def measure_allocations(fn, frames, expected):
+    """Peak Python-heap bytes and allocated blocks per call. Buffers OpenCV allocates itself are not traced."""
+    peaks, blocks = [], []
+    tracemalloc.start()
+    try:
+        for name, frame in frames.items():
+            tracemalloc.reset_peak()
+            before_bytes, _ = tracemalloc.get_traced_memory()
+            before = tracemalloc.take_snapshot()
+            fn(frame, expected.get(name))
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            peaks.append(peak - before_bytes)
+            blocks.append(sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0))
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": round(max(peaks) / 1024, 1), "blocks_per_call": int(np.mean(blocks))}
+
+def check_outputs(outputs, expected, field):
+    mismatches = []
+    for name, output in outputs.items():
+        if name not in expected:
+            mismatches.append(f"{name}: no expected entry")
+        elif output != expected[name][field]:
+            mismatches.append(f"{name}: got {output}, expected {expected[name][field]}")
+    return mismatches
+
+def run_suite(frames, expected, iterations, allocations=True):
+    results = {}
+    for stage, (settings, fn, field) in build_stages().items():
+        with config_override(**settings), contextlib.redirect_stdout(io.StringIO()):
+            samples, outputs = time_stage(fn, frames, expected, iterations)
+            allocation = measure_allocations(fn, frames, expected) if allocations else {}
+        mismatches = check_outputs(outputs, expected, field)
+        results[stage] = {**percentiles(samples), **allocation, "calls": len(samples), "mismatches": mismatches}
+    return results
+
+
+# --- Expected outputs ---
+def record_expected(frames):
+    expected = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, frame in frames.items():
+            expected[name] = {"board": board_stage(frame, None), "shapes": tray_stage(frame, None)}
+            expected[name]["placement"] = make_placement_stage("python")(frame, expected[name])
+            for engine, field in PLACEMENT_FIELDS.items():
+                expected[name][field] = make_placement_stage(engine)(frame, expected[name])
+    return expected
+
+def load_expected(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+# --- Reporting ---
+def compare_results(current, previous, tolerance):
+    """Stages whose p50 grew by more than tolerance (fraction) against a previous results file."""
+    regressions = []
+    for stage, stats in current["stages"].items():
+        old = previous.get("stages", {}).get(stage)
+        if old and stats["p50_us"] > old["p50_us"] * (1 + tolerance):
+            regressions.append(f"{stage}: p50 {old['p50_us']:.1f}us -> {stats['p50_us']:.1f}us")
+    return regressions
+
+def print_table(results):
+    print(f"{'stage':<20}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'peak KiB':>10}{'blocks':>8}  check")
+    for stage, stats in results.items():
+        check = "ok" if not stats["mismatches"] else f"{len(stats['mismatches'])} mismatches"
+        peak = f"{stats['peak_kib']:.1f}" if "peak_kib" in stats else "-"
+        blocks = stats.get("blocks_per_call", "-")
+        print(f"{stage:<20}{stats['p50_us']:>10.1f}{stats['p95_us']:>10.1f}{stats['p99_us']:>10.1f}"
+              f"{peak:>10}{blocks:>8}  {check}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", type=find_target, default=13, help="config id or name passed to set_context")
+    parser.add_argument("--images", default="test_data/")
+    parser.add_argument("--expected", default="bench_expected.json")
+    parser.add_argument("--output", default="cache/bench_results.json")
+    parser.add_argument("--iterations", type=int, default=50, help="timed calls per image and stage")
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--compare", help="previous results file to check for p50 regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown as a fraction")
+    parser.add_argument("--update-expected", action="store_true")
+    args = parser.parse_args(argv)
+
+    set_context(args.target)
+    load_registry(get_context().shape_registry_path)
+    frames = load_frames(args.images)
+
+    if args.update_expected:
+        expected = record_expected(frames)
+        with open(args.expected, "w") as f:
+            # One image per line keeps diffs of the expected file readable
+            f.write("{\n" + ",\n".join(f" {json.dumps(name)}: {json.dumps(entry)}"
+                                        for name, entry in expected.items()) + "\n}\n")
+        print(f"Recorded expected outputs for {len(frames)} images in {args.expected}")
+        return 0
+
+    expected = load_expected(args.expected)
+    previous = None
+    if args.compare:
+        # Read it first: --compare may name the same file --output overwrites
+        with open(args.compare) as f:
+            previous = json.load(f)
+    results = run_suite(frames, expected, args.iterations, allocations=not args.no_allocations)
+    report = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "images": len(frames),
+        "iterations": args.iterations,
+        "stages": results,
+    }
+    print_table(results)
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {args.output}")
+
+    failed = any(stats["mismatches"] for stats in results.values())
+    for stage, stats in results.items():
+        for mismatch in stats["mismatches"]:
+            print(f"MISMATCH {stage} {mismatch}")
+    if previous is not None:
+        regressions = compare_results(report, previous, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
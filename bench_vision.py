@@ -0,0 +1,104 @@
+import contextlib
+import io
+import os
+import timeit
+import cv2
+import numpy as np
+from context import set_context, get_context, get_template_cache
+from board_detection import classify_board_cells, classify_board_grid, gather_cell_windows, load_board_template
+from block_detection import (
+    convert_matches_to_grid, correlation_map, deduplicate_matches, find_grid_peaks, grid_points_to_shape_matrices,
+    load_block_template, read_tray_by_sampling,
+)
+
+def load_board_rois(image_dir="test_data/"):
+    x, y, w, h = get_context().board_roi
+    rois = {}
+    for image_file in sorted(os.listdir(image_dir)):
+        if image_file.startswith("."):
+            continue
+        frame = cv2.imread(os.path.join(image_dir, image_file))
+        rois[image_file] = cv2.cvtColor(frame[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+    return rois
+
+def bench(fn, template, rois, repeat=5, number=20):
+    def run():
+        for roi in rois.values():
+            fn(template, roi)
+
+    # Silence the per-call threshold prints so only the classification is timed
+    with contextlib.redirect_stdout(io.StringIO()):
+        best = min(timeit.repeat(run, number=number, repeat=repeat))
+    return best / (number * len(rois)) * 1e6
+
+def load_tray_maps(image_dir="test_data/"):
+    cfg = get_context()
+    template_processed = get_template_cache().get("block", cfg.block_template_path, load_block_template)
+    maps = {}
+    for image_file in sorted(os.listdir(image_dir)):
+        if image_file.startswith("."):
+            continue
+        frame = cv2.imread(os.path.join(image_dir, image_file))
+        maps[image_file] = correlation_map(frame, template_processed, cfg.block_roi)
+    return maps, template_processed.shape
+
+def peaks_by_dedup(size, result, threshold=0.28):
+    """The original path: one dict per hit, O(n^2) dedup, then snap to grid."""
+    h, w = size
+    x0, y0 = get_context().block_roi[:2]
+    ys, xs = np.where(result >= threshold)
+    matches = [{'location': (x + x0, y + y0), 'size': (w, h), 'confidence': result[y, x]} for y, x in zip(ys, xs)]
+    return convert_matches_to_grid(deduplicate_matches(matches, pixel_thresh=10), w, h)
+
+def peaks_by_binning(size, result, threshold=0.28):
+    h, w = size
+    return find_grid_peaks(result, threshold, w, h, offset=get_context().block_roi[:2])
+
+def load_frames(image_dir="test_data/"):
+    return {image_file: cv2.imread(os.path.join(image_dir, image_file))
+            for image_file in sorted(os.listdir(image_dir)) if not image_file.startswith(".")}
+
+def tray_by_template(template_processed, frame):
+    cfg = get_context()
+    result = correlation_map(frame, template_processed, cfg.block_roi)
+    h, w = template_processed.shape
+    return grid_points_to_shape_matrices(find_grid_peaks(result, 0.28, w, h, offset=cfg.block_roi[:2]))
+
+def tray_by_sampling(_, frame):
+    return read_tray_by_sampling(frame)
+
+def vectorized(template, roi):
+    return classify_board_grid(template, gather_cell_windows(template, roi))
+
+if __name__ == "__main__":
+    set_context(13)
+    template = get_template_cache().get("board", get_context().board_template_path, load_board_template)
+    rois = load_board_rois()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, roi in rois.items():
+            expected, expected_threshold, _ = classify_board_cells(template, roi)
+            grid, threshold = classify_board_grid(template, gather_cell_windows(template, roi))
+            if grid is None or grid.tolist() != expected or threshold != expected_threshold:
+                raise AssertionError(f"Vectorized classifier disagrees on {name}")
+    print(f"Classifiers agree on {len(rois)} images")
+    print(f"    loop: {bench(classify_board_cells, template, rois):8.1f} us per board")
+    print(f"  vector: {bench(vectorized, template, rois):8.1f} us per board")
+
+    maps, size = load_tray_maps()
+    for name, result in maps.items():
+        if peaks_by_dedup(size, result) != peaks_by_binning(size, result):
+            raise AssertionError(f"Grid peaks disagree on {name}")
+    print(f"Tray peak extraction agrees on {len(maps)} images")
+    print(f"   dedup: {bench(peaks_by_dedup, size, maps):8.1f} us per tray")
+    print(f" binning: {bench(peaks_by_binning, size, maps):8.1f} us per tray")
+
+    frames = load_frames()
+    template_processed = get_template_cache().get("block", get_context().block_template_path, load_block_template)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, frame in frames.items():
+            if read_tray_by_sampling(frame) != tray_by_template(template_processed, frame):
+                raise AssertionError(f"Tray readers disagree on {name}")
+    print(f"Tray readers agree on {len(frames)} images")
+    print(f"template: {bench(tray_by_template, template_processed, frames, number=3):8.1f} us per frame")
+    print(f"sampling: {bench(tray_by_sampling, template_processed, frames, number=3):8.1f} us per frame")
@@ -1,41 +1,60 @@
+import logging
 import cv2
 from collections import deque
 import numpy as np
-from context import get_context
+from context import get_context, get_template_cache
+from frame_capture import load_image
+from shape_registry import is_known_piece
+from vision_view import ROI_MARGIN, THRESHOLD_BLOCK, get_vision_view
 
-def shape_match(source, template, roi=None, threshold=0.75):
-    """Match shapes ignoring color and texture"""
+logger = logging.getLogger(__name__)
+
+def preprocess_shape_image(image, block_size=THRESHOLD_BLOCK):
+    """Grayscale, blur, adaptive threshold and close: removes color and texture, keeps outlines."""
     # Convert grayscale to remove color information
-    source_gray = cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
-    template_gray = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
     # Apply Gaussian blur
-    source_gray = cv2.GaussianBlur(source_gray, (3, 3), 0)
-    template_gray = cv2.GaussianBlur(template_gray, (3, 3), 0)
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
 
     # Apply adaptive thresholding to binarize images
     # This removes texture and focuses on shape outlines
-    source_bin = cv2.adaptiveThreshold(source_gray, 255,
-                                       cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                       cv2.THRESH_BINARY_INV, 19, 0)
-    template_bin = cv2.adaptiveThreshold(template_gray, 255,
-                                         cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                         cv2.THRESH_BINARY_INV, 19, 0)
+    binary = cv2.adaptiveThreshold(gray, 255,
+                                   cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY_INV, block_size, 0)
 
     kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (1, 1))
-    source_processed = cv2.morphologyEx(source_bin, cv2.MORPH_CLOSE, kernel)
-    template_processed = cv2.morphologyEx(template_bin, cv2.MORPH_CLOSE, kernel)
+    return cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+
+def load_block_template(template_path):
+    template = cv2.imread(template_path)
+    if template is None:
+        raise FileNotFoundError(f"Could not load block template {template_path}")
+    return preprocess_shape_image(template)
+
+def shape_match(source, template, roi=None, threshold=0.75):
+    """Match shapes ignoring color and texture"""
+    return match_processed_template(source, preprocess_shape_image(template), roi, threshold)
 
-    # Apply ROI if specified
+def correlation_map(source, template_processed, roi=None, block_size=THRESHOLD_BLOCK):
+    """TM_CCOEFF_NORMED map of a preprocessed template over the (ROI of the) source"""
     if roi is not None:
+        # Preprocess only the ROI plus a margin covering the blur and adaptive threshold windows;
+        # the ROI comes out the same as when the whole frame is preprocessed
         x, y, w, h = roi
-        source_roi = source_processed[y:y + h, x:x + w]
+        x0, y0 = max(0, x - ROI_MARGIN), max(0, y - ROI_MARGIN)
+        source_processed = preprocess_shape_image(source[y0:y + h + ROI_MARGIN, x0:x + w + ROI_MARGIN], block_size)
+        source_roi = source_processed[y - y0:y - y0 + h, x - x0:x - x0 + w]
     else:
-        source_roi = source_processed
+        source_roi = preprocess_shape_image(source, block_size)
 
     # Perform template matching
-    result = cv2.matchTemplate(source_roi, template_processed,
-                               cv2.TM_CCOEFF_NORMED)
+    return cv2.matchTemplate(source_roi, template_processed,
+                             cv2.TM_CCOEFF_NORMED)
+
+def match_processed_template(source, template_processed, roi=None, threshold=0.75):
+    """shape_match against a template that already went through preprocess_shape_image"""
+    result = correlation_map(source, template_processed, roi)
 
     # Find matches above threshold
     locs = np.where(result >= threshold)
@@ -84,6 +103,22 @@ def convert_matches_to_grid(matches, w, h, tolerance=0.3):
         grid_points.add((gx, gy))
     return grid_points
 
+def find_grid_peaks(result, threshold, block_w, block_h, offset=(0, 0), tolerance=0.3):
+    """
+    Bin every correlation hit straight into the tray grid (same rule as snap_to_grid) and
+    keep one point per occupied cell. Replaces deduplicate_matches + convert_matches_to_grid.
+    """
+    # flatnonzero + divmod is several times faster than 2-D nonzero on a sparse map
+    ys, xs = np.divmod(np.flatnonzero(result >= threshold), result.shape[1])
+    if xs.size == 0:
+        return set()
+    gx = ((xs + offset[0] + block_w * tolerance) // block_w).astype(np.int64)
+    gy = ((ys + offset[1] + block_h * tolerance) // block_h).astype(np.int64)
+    # Pack (gx, gy) into one key so the unique pass stays 1-D
+    stride = int(gy.max()) + 1
+    cells = np.unique(gx * stride + gy)
+    return {(int(cell // stride), int(cell % stride)) for cell in cells}
+
 def group_grid_shapes(points):
     visited = set()
     groups = []
@@ -123,17 +158,135 @@ def extract_sorted_shape_matrices(matches, tolerance=0.3, pixel_dedup=10):
     matches = deduplicate_matches(matches, pixel_thresh=pixel_dedup)
     w, h = estimate_block_size(matches)
     grid_points = convert_matches_to_grid(matches, w, h)
+    return grid_points_to_shape_matrices(grid_points)
+
+def grid_points_to_shape_matrices(grid_points):
     grouped_shapes = group_grid_shapes(grid_points)
     shape_matrices = [shape_to_matrix(g) for g in grouped_shapes]
     shape_matrices.sort(key=lambda x: x[0])  # sort left to right
-    print(f"<UNK> Shape Matrices:\n{shape_matrices}")
+    logger.debug("Shape matrices: %s", shape_matrices)
     return [(mat, _) for _, mat in shape_matrices]
 
-def get_block_shapes(img_path, threshold=0.28):
-    template = cv2.imread(get_context().block_template_path)
-    source = cv2.imread(img_path)
-    matches = shape_match(source, template, roi=get_context().block_roi, threshold=threshold)
-    return extract_sorted_shape_matrices(matches, tolerance=0.3, pixel_dedup=10)
+def _long_runs(occupied, min_run):
+    """(start, end) index pairs of True runs at least min_run long"""
+    runs = []
+    start = None
+    for i, value in enumerate(occupied.tolist() + [False]):
+        if value and start is None:
+            start = i
+        elif not value and start is not None:
+            if i - start >= min_run:
+                runs.append((start, i - 1))
+            start = None
+    return runs
+
+def _read_slot(mask, step, cell_size):
+    """
+    Shape matrix and its left edge (in mask samples) for one tray slot of the sampled
+    block mask. Returns (None, None) for an empty slot and (False, None) if unreadable.
+    """
+    # Runs shorter than ~half a cell are bubbles or sparkles, not blocks
+    min_run = max(1, int(cell_size * 0.5 / step))
+    col_runs = _long_runs(mask.any(axis=0), min_run)
+    row_runs = _long_runs(mask.any(axis=1), min_run)
+    if not col_runs or not row_runs:
+        return None, None
+
+    left, right = col_runs[0][0], col_runs[-1][1]
+    top, bottom = row_runs[0][0], row_runs[-1][1]
+    cols = round((right - left + 1) * step / cell_size)
+    rows = round((bottom - top + 1) * step / cell_size)
+    if not 1 <= cols <= 5 or not 1 <= rows <= 5:
+        return False, None
+
+    # Classify each cell from a small patch of samples around its center
+    pitch_x = (right - left + 1) / cols
+    pitch_y = (bottom - top + 1) / rows
+    shape = []
+    for r in range(rows):
+        cy = int(top + (r + 0.5) * pitch_y)
+        row = []
+        for c in range(cols):
+            cx = int(left + (c + 0.5) * pitch_x)
+            patch = mask[max(cy - 1, 0):cy + 2, max(cx - 1, 0):cx + 2]
+            row.append(1 if patch.mean() > 0.5 else 0)
+        shape.append(row)
+    return shape, left
+
+def read_tray_by_sampling(image, cfg=None):
+    """
+    Template-free tray reader: classify a coarse lattice of samples against the tray
+    background color and build each slot's shape matrix directly. Returns the same
+    [(matrix, shape_loc)] list as get_block_shapes, or None when a slot does not read
+    as a known piece so the caller can fall back to template matching.
+    """
+    cfg = cfg or get_context()
+    # Stay clear of the tray's frame and rounded corners
+    inset = int(round(cfg.tray_sample_inset))
+    x, y, w, h = cfg.block_roi
+    x, y, w, h = x + inset, y + inset, w - 2 * inset, h - 2 * inset
+    step = cfg.tray_sample_step
+    samples = image[y:y + h:step, x:x + w:step].astype(np.int16)
+    # The tray is mostly empty background, so the median sample is its color
+    background = np.median(samples.reshape(-1, 3), axis=0)
+    mask = np.abs(samples - background).sum(axis=2) > cfg.tray_color_threshold
+
+    # Drop blobs smaller than ~half a cell (bubbles, sparkles) before reading slots
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=4)
+    min_area = 0.4 * (cfg.tray_cell_size / step) ** 2
+    keep = np.zeros(count, dtype=bool)
+    keep[1:] = stats[1:, cv2.CC_STAT_AREA] >= min_area
+    mask = keep[labels]
+
+    shapes = []
+    slot_width = mask.shape[1] / 3
+    for slot in range(3):
+        start = int(round(slot * slot_width))
+        shape, left = _read_slot(mask[:, start:int(round((slot + 1) * slot_width))], step, cfg.tray_cell_size)
+        if shape is None:
+            continue  # slot already used this round
+        if shape is False or not is_known_piece(shape):
+            return None
+        # Same grid coordinate the template path reports, so get_tap_pos works unchanged;
+        # measured in screenshot pixels when reading a reduced-resolution view
+        left_px = cfg.frame_origin[0] + (x + (start + left) * step) * cfg.frame_factor
+        cell_px = cfg.tray_cell_size * cfg.frame_factor
+        shapes.append((shape, int((left_px + cell_px * 0.3) // cell_px)))
+    return shapes
+
+def get_block_shapes(image, threshold=0.28):
+    cfg = get_context()
+    source = load_image(image)
+    view = get_vision_view(cfg)
+    if cfg.tray_reader == "sampling":
+        if view is None:
+            shapes = read_tray_by_sampling(source, cfg)
+        else:
+            shapes = read_tray_by_sampling(view.tray_image(source), view.tray_config)
+        if shapes is not None:
+            logger.debug("Shape matrices (sampled): %s", shapes)
+            return shapes
+        logger.info("Tray sampling failed validation, falling back to template matching")
+    if view is None:
+        # The binarized block template is built once and cached in the context
+        template_processed = get_template_cache().get("block", cfg.block_template_path, load_block_template)
+        h, w = template_processed.shape
+        block_size = THRESHOLD_BLOCK
+    else:
+        # Outline matching needs area-averaged pixels, not the strided ones sampling reads,
+        # and a view no coarser than TEMPLATE_MAX_SCALE
+        view = view.template_view
+        source, cfg = view.tray_image(source, smooth=True), view.tray_config
+        template_processed = view.templates.get("block", cfg.block_template_path, view.load_block_template)
+        # The resized template is rounded to whole pixels; bin peaks on the exact scaled pitch
+        h = w = cfg.tray_cell_size
+        block_size = view.threshold_block
+    result = correlation_map(source, template_processed, roi=cfg.block_roi, block_size=block_size)
+    # Peaks are binned on the screenshot's tray grid, wherever the view starts
+    offset = (cfg.block_roi[0] + cfg.frame_origin[0] / cfg.frame_factor,
+              cfg.block_roi[1] + cfg.frame_origin[1] / cfg.frame_factor)
+    grid_points = find_grid_peaks(result, threshold, w, h, offset=offset, tolerance=0.3)
+    return grid_points_to_shape_matrices(grid_points)
 
 if __name__ == "__main__":
     import os
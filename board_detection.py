@@ -1,45 +1,41 @@
+import logging
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
-from context import get_context
-def get_current_board(current_path):
-    roi_board_coords = get_context().board_roi
-    # Detect blocks with mean difference comparison
-    board_matrix, threshold = detect_blocks_by_mean_difference(
-        get_context().board_template_path,
-        current_path,
-        roi_board_coords,
-        False,
-    )
-    print(f"board: {board_matrix} with threshold: {threshold:.2f}")
-    return board_matrix, threshold
+from context import get_context, get_template_cache
+from frame_capture import load_image
+from vision_view import get_vision_view
 
-def detect_blocks_by_mean_difference(template_path, current_path, roi_coords=None, show_plot=False):
-    """
-    Detect blocks by comparing mean difference across entire cell areas
-    """
-    # Load both images
-    template_img = cv2.imread(template_path)
-    current_img = cv2.imread(current_path)
+logger = logging.getLogger(__name__)
 
-    if template_img is None or current_img is None:
-        print("Error: Could not load images")
+def get_current_board(current):
+    cfg = get_context()
+    current_img = load_image(current)
+    if current_img is None:
+        logger.error("Could not load images")
         return None, None
+    view = get_vision_view(cfg)
+    if view is None:
+        # Grayscale template ROI and per-cell slices are built once and cached in the context
+        template = get_template_cache().get("board", cfg.board_template_path, load_board_template)
+    else:
+        # Reduced-resolution mode: template and frame both go through the view
+        template = view.templates.get("board", cfg.board_template_path, view.load_board_template)
+        current_img, cfg = view.board_image(current_img), view.board_config
+
+    x, y, w, h = cfg.board_roi
+    # Convert only the sampled pixels; fall back to the per-cell loop on irregular grids
+    current_windows = gather_cell_windows(template, current_img, (x, y))
+    if current_windows is not None:
+        grid, threshold = classify_board_grid(template, cv2.cvtColor(current_windows, cv2.COLOR_BGR2GRAY))
+        board_matrix = grid.tolist()
+    else:
+        current_gray = cv2.cvtColor(current_img[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+        board_matrix, threshold, _ = classify_board_cells(template, current_gray)
+    logger.debug("board: %s with threshold: %.2f", board_matrix, threshold)
+    return board_matrix, threshold
 
-    # Apply ROI if specified
-    if roi_coords:
-        x, y, w, h = roi_coords
-        template_img = template_img[y:y + h, x:x + w]
-        current_img = current_img[y:y + h, x:x + w]
-
-    # Convert to grayscale
-    template_gray = cv2.cvtColor(template_img, cv2.COLOR_BGR2GRAY)
-    current_gray = cv2.cvtColor(current_img, cv2.COLOR_BGR2GRAY)
-
-    grid_rows, grid_cols = (10, 10)
-
+def compute_cell_regions(block_size, grid_rows=10, grid_cols=10, gap=2):
     grid_top_left = (0, 0)
-    block_size = get_context().block_size_on_board
 
     # Calculate cell regions
     cell_regions = []
@@ -47,27 +43,102 @@ def detect_blocks_by_mean_difference(template_path, current_path, roi_coords=Non
         for col in range(grid_cols):
             # Define cell boundaries with margin to avoid grid lines
             margin = block_size // 10
-            x1 = grid_top_left[0] + block_size/2 - margin + block_size *col + col*2
-            y1 = grid_top_left[1] + block_size/2 - margin + block_size *row + row*2
-            x2 = grid_top_left[0] + block_size/2 + margin + block_size *col + col*2
-            y2 = grid_top_left[1] + block_size/2 + margin + block_size *row + row*2
+            x1 = grid_top_left[0] + block_size/2 - margin + block_size *col + col*gap
+            y1 = grid_top_left[1] + block_size/2 - margin + block_size *row + row*gap
+            x2 = grid_top_left[0] + block_size/2 + margin + block_size *col + col*gap
+            y2 = grid_top_left[1] + block_size/2 + margin + block_size *row + row*gap
 
             # Skip invalid regions
             if x1 >= x2 or y1 >= y2:
                 continue
 
             cell_regions.append((row, col, x1, y1, x2, y2))
+    return cell_regions
+
+def prepare_board_template(template_img, roi_coords=None, cfg=None):
+    """Grayscale board ROI plus the per-cell template slices and their mean intensity."""
+    if roi_coords:
+        x, y, w, h = roi_coords
+        template_img = template_img[y:y + h, x:x + w]
+    template_gray = cv2.cvtColor(template_img, cv2.COLOR_BGR2GRAY)
+    cfg = cfg or get_context()
+    cell_regions = compute_cell_regions(cfg.block_size_on_board, gap=cfg.board_grid_gap)
+    cells = [template_gray[int(y1):int(y2), int(x1):int(x2)] for _, _, x1, y1, x2, y2 in cell_regions]
+    sample_rows, sample_cols = compute_sample_indices(cell_regions, template_gray.shape)
+    template = {
+        "gray": template_gray,
+        "regions": cell_regions,
+        "cells": cells,
+        "means": [float(np.mean(cell)) if cell.size else 0.0 for cell in cells],
+        "sample_rows": sample_rows,
+        "sample_cols": sample_cols,
+    }
+    template["windows"] = gather_cell_windows(template, template_gray)
+    return template
+
+def compute_sample_indices(cell_regions, roi_shape, grid_rows=10, grid_cols=10):
+    """
+    Pixel indices of every cell's sample window as (grid_rows, h) and (grid_cols, w) arrays,
+    or (None, None) when the windows are not a regular grid of equal-sized squares.
+    """
+    if len(cell_regions) != grid_rows * grid_cols:
+        return None, None
+    row_spans = {}
+    col_spans = {}
+    for row, col, x1, y1, x2, y2 in cell_regions:
+        if row_spans.setdefault(row, (int(y1), int(y2))) != (int(y1), int(y2)):
+            return None, None
+        if col_spans.setdefault(col, (int(x1), int(x2))) != (int(x1), int(x2)):
+            return None, None
+    heights = {y2 - y1 for y1, y2 in row_spans.values()}
+    widths = {x2 - x1 for x1, x2 in col_spans.values()}
+    if len(heights) != 1 or len(widths) != 1 or 0 in heights or 0 in widths:
+        return None, None
+    if max(y2 for _, y2 in row_spans.values()) > roi_shape[0] or max(x2 for _, x2 in col_spans.values()) > roi_shape[1]:
+        return None, None
+    sample_rows = np.array([np.arange(*row_spans[r]) for r in range(grid_rows)])
+    sample_cols = np.array([np.arange(*col_spans[c]) for c in range(grid_cols)])
+    return sample_rows, sample_cols
+
+def gather_cell_windows(template, image, offset=(0, 0)):
+    """
+    Pull every cell's sample window out of an image in one fancy-indexing pass.
+    Returns a (grid_rows * h, grid_cols * w[, channels]) array, or None without a regular grid.
+    """
+    sample_rows, sample_cols = template["sample_rows"], template["sample_cols"]
+    if sample_rows is None:
+        return None
+    rows = sample_rows.ravel() + offset[1]
+    cols = sample_cols.ravel() + offset[0]
+    if rows[-1] >= image.shape[0] or cols[-1] >= image.shape[1]:
+        return None
+    return image[rows][:, cols]
+
+def classify_board_grid(template, current_windows):
+    """
+    Vectorized classify_board_cells over windows from gather_cell_windows: one absdiff
+    and one reduction to a mean matrix. Returns (grid ndarray, threshold).
+    """
+    grid_rows, window_h = template["sample_rows"].shape
+    grid_cols, window_w = template["sample_cols"].shape
 
-    # Create visualization images
-    template_rgb = cv2.cvtColor(template_img, cv2.COLOR_BGR2RGB)
-    current_rgb = cv2.cvtColor(current_img, cv2.COLOR_BGR2RGB)
+    diff = cv2.absdiff(template["windows"], current_windows)
+    mean_diffs = diff.reshape(grid_rows, window_h, grid_cols, window_w).mean(axis=(1, 3))
 
-    # current_vis = current_img.copy()
-    # for row, col, x1, y1, x2, y2 in cell_regions:
-    #     cv2.rectangle(current_vis,
-    #                   (int(x1), int(y1)),
-    #                   (int(x2), int(y2)),
-    #                   (0, 255, 0), 2)
+    # Calculate dynamic threshold based on the least different (empty) cell
+    threshold = mean_diffs.min() + 10
+    logger.debug("Calculated dynamic threshold: %.2f (median diff: %.2f)", threshold, threshold - 10)
+    return (mean_diffs > threshold).astype(np.uint8), threshold
+
+def load_board_template(template_path):
+    template_img = cv2.imread(template_path)
+    if template_img is None:
+        raise FileNotFoundError(f"Could not load board template {template_path}")
+    return prepare_board_template(template_img, get_context().board_roi)
+
+def classify_board_cells(template, current_gray, grid_rows=10, grid_cols=10):
+    """Returns (block_matrix, threshold, block_count) for a grayscale board ROI."""
+    cell_regions = template["regions"]
 
     # Detect blocks by mean difference
     block_matrix = [[0 for _ in range(grid_cols)] for _ in range(grid_rows)]
@@ -76,9 +147,8 @@ def detect_blocks_by_mean_difference(template_path, current_path, roi_coords=Non
     # Store differences for threshold calibration
     differences = []
 
-    for row, col, x1, y1, x2, y2 in cell_regions:
-        # Extract cell regions from both images
-        template_cell = template_gray[int(y1):int(y2), int(x1):int(x2)]
+    for (row, col, x1, y1, x2, y2), template_cell in zip(cell_regions, template["cells"]):
+        # Extract cell region from the current image
         current_cell = current_gray[int(y1):int(y2), int(x1):int(x2)]
 
         if template_cell.size == 0 or current_cell.size == 0:
@@ -93,44 +163,56 @@ def detect_blocks_by_mean_difference(template_path, current_path, roi_coords=Non
         mean_diff = np.mean(diff)
         differences.append(mean_diff)
 
-        # Draw the difference value on visualization
-        # diff_text = f"{mean_diff:.1f}"
-        # cv2.putText(current_vis, diff_text,
-        #             (int((x1 + x2) / 2) - 10, int((y1 + y2) / 2)),
-        #             cv2.FONT_HERSHEY_SIMPLEX, 0.2, (0, 0, 255), 1)
-    # cv2.imshow("current_vis", current_vis)
-    # cv2.waitKey(0)
-
     # Calculate dynamic threshold based on median difference
     if differences:
         median_diff = np.min(differences)
         threshold = median_diff + 10 # Adjust multiplier as needed
-        print(f"Calculated dynamic threshold: {threshold:.2f} (median diff: {median_diff:.2f})")
+        logger.debug("Calculated dynamic threshold: %.2f (median diff: %.2f)", threshold, median_diff)
     else:
         threshold = 10  # Fallback value
-        print(f"Using fallback threshold: {threshold}")
+        logger.debug("Using fallback threshold: %s", threshold)
 
     # Second pass to detect blocks using the threshold
-    for i, (row, col, x1, y1, x2, y2) in enumerate(cell_regions):
+    for i, (row, col, x1, y1, x2, y2) in enumerate(cell_regions[:len(differences)]):
         mean_diff = differences[i]
 
         # If difference is significant, mark as block
         if mean_diff > threshold:
             block_count += 1
             block_matrix[row][col] = 1
-            # Highlight block in visualization
-            # cv2.rectangle(current_vis,
-            #               (int(x1), int(y1)),
-            #               (int(x2), int(y2)),
-            #               (0, 255, 0), 2)
-            #
-            # # Draw block indicator
-            # cv2.putText(current_vis, "B",
-            #             (int((x1 + x2) / 2) - 5, int((y1 + y2) / 2) + 5),
-            #             cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+
+    return block_matrix, threshold, block_count
+
+def detect_blocks_by_mean_difference(template_path, current_path, roi_coords=None, show_plot=False):
+    """
+    Detect blocks by comparing mean difference across entire cell areas.
+    current_path may also be an already decoded frame.
+    """
+    # Load both images
+    template_img = cv2.imread(template_path)
+    current_img = load_image(current_path)
+
+    if template_img is None or current_img is None:
+        logger.error("Could not load images")
+        return None, None
+
+    # Apply ROI if specified
+    if roi_coords:
+        x, y, w, h = roi_coords
+        template_img = template_img[y:y + h, x:x + w]
+        current_img = current_img[y:y + h, x:x + w]
+
+    template = prepare_board_template(template_img)
+    current_gray = cv2.cvtColor(current_img, cv2.COLOR_BGR2GRAY)
+    block_size = get_context().block_size_on_board
+    block_matrix, threshold, block_count = classify_board_cells(template, current_gray)
 
     if show_plot:
+        # Debug only; matplotlib takes longer to import than everything else here
+        import matplotlib.pyplot as plt
         # Create visualization
+        template_rgb = cv2.cvtColor(template_img, cv2.COLOR_BGR2RGB)
+        current_rgb = cv2.cvtColor(current_img, cv2.COLOR_BGR2RGB)
         plt.figure(figsize=(20, 15))
         
         # Template image
@@ -160,11 +242,12 @@ def detect_blocks_by_mean_difference(template_path, current_path, roi_coords=Non
         plt.tight_layout()
         plt.show()
         
-        print(f"Detected {block_count} blocks on the board")
+        logger.info("Detected %d blocks on the board", block_count)
     return block_matrix, threshold
 
 def plot_block_matrix(block_matrix, block_size=50):
     """Create a visualization of the block matrix"""
+    import matplotlib.pyplot as plt
     rows = len(block_matrix)
     cols = len(block_matrix[0]) if rows > 0 else 0
 
@@ -173,7 +256,7 @@ def plot_block_matrix(block_matrix, block_size=50):
 
     # Create blank image
     img = np.ones((rows * block_size, cols * block_size, 3), dtype=np.uint8) * 255
-    print(block_matrix)
+    logger.debug("%s", block_matrix)
     for row in range(rows):
         for col in range(cols):
             if block_matrix[row][col]:
@@ -0,0 +1,272 @@
+"""
+Measure a device's board and tray geometry from one screenshot of an empty board, and cache
+a config class plus templates for that screen size and scale.
+
+    python calibration.py empty_board.png --scale 3
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import cv2
+import numpy as np
+from config import CONFIGS, find_target
+from screen_state import ALL_POPUP_TAPS
+
+logger = logging.getLogger(__name__)
+
+GEOMETRY_VERSION = 1
+GRID_SIZE = 10
+
+# Board and tray panels: dark, saturated blue; excludes the black letterbox and the backdrop.
+PANEL_VALUE = (30, 120)
+PANEL_MIN_SATURATION = 60
+# Interior grid lines must stand out this much over the board's mean edge strength.
+MIN_GRID_CONTRAST = 3.0
+
+
+class CalibrationError(RuntimeError):
+    pass
+
+
+# --- Measurement ---
+def panel_mask(hsv):
+    value, saturation = hsv[..., 2], hsv[..., 1]
+    return (value > PANEL_VALUE[0]) & (value < PANEL_VALUE[1]) & (saturation > PANEL_MIN_SATURATION)
+
+def find_panels(hsv):
+    """(board, tray) bounding boxes as (x, y, w, h) of the two dark game panels."""
+    mask = cv2.morphologyEx(panel_mask(hsv).astype(np.uint8), cv2.MORPH_OPEN, np.ones((5, 5), np.uint8))
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=4)
+    panels = sorted((tuple(int(v) for v in stat[:4]) for stat in stats[1:]), key=lambda p: -p[2] * p[3])
+
+    min_side = hsv.shape[1] // 2
+    board = next((p for p in panels if p[2] >= min_side and 0.9 <= p[2] / p[3] <= 1.1), None)
+    if board is None:
+        raise CalibrationError("No square board panel found")
+    # The tray sits under the board and spans about the same width
+    tray = next((p for p in panels if p[1] > board[1] + board[3] and p[2] >= 0.8 * board[2] and p[2] / p[3] >= 2.5),
+                None)
+    if tray is None:
+        raise CalibrationError("No tray panel found under the board")
+    return board, tray
+
+def edge_profile(gray, axis):
+    """Mean absolute gradient across axis (0: per column, 1: per row), widened by a sample."""
+    diff = np.abs(np.diff(gray, axis=1 - axis)).mean(axis=axis)
+    return np.maximum(diff, np.roll(diff, 1))
+
+def fit_grid(profile, lines=GRID_SIZE):
+    """
+    (origin, pitch, contrast) of the evenly spaced grid whose lines - 1 interior lines sit on
+    the strongest edges of profile. contrast is their mean strength over the profile's mean.
+    """
+    length = len(profile)
+    best = (-1.0, 0.0, 0.0)
+    interior = np.arange(1, lines)
+    for pitch in np.arange(length / (lines + 0.8), length / (lines - 0.2), 0.25):
+        for origin in np.arange(0, length - lines * pitch + 1, 0.5):
+            strength = profile[np.round(origin + pitch * interior).astype(int)].sum()
+            if strength > best[0]:
+                best = (strength, origin, pitch)
+    strength, origin, pitch = best
+    contrast = strength / (lines - 1) / max(float(profile.mean()), 1e-6)
+    return float(origin), float(pitch), float(contrast)
+
+def grid_line_width(gray, origin, pitch, axis, lines=GRID_SIZE):
+    """Median width in px of the interior grid lines; the gap between neighbouring cells."""
+    diff = np.abs(np.diff(gray, axis=1 - axis)).mean(axis=axis)
+    widths = []
+    for k in range(1, lines):
+        center = int(round(origin + k * pitch))
+        window = diff[max(center - 4, 0):center + 5]
+        strong = np.flatnonzero(window > window.max() / 2)
+        # a line n px wide gives a rising and a falling edge n samples apart
+        widths.append(max(1, int(strong[-1] - strong[0])) if strong.size else 1)
+    return int(np.clip(np.median(widths), 1, 4))
+
+def board_is_empty(hsv, left, top, pitch):
+    """True when every cell centre still shows the panel colour; pieces are brighter."""
+    centers = ((np.arange(GRID_SIZE) + 0.5) * pitch).astype(int)
+    return bool(panel_mask(hsv[top + centers][:, left + centers]).all())
+
+def measure_geometry(frame):
+    """Board grid, tray band and derived tap points of a screenshot, in screenshot pixels."""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    (bx, by, bw, bh), (tx, ty, tw, th) = find_panels(hsv)
+    gray = cv2.cvtColor(frame[by:by + bh, bx:bx + bw], cv2.COLOR_BGR2GRAY).astype(np.float32)
+    origin_x, pitch_x, contrast_x = fit_grid(edge_profile(gray, 0))
+    origin_y, pitch_y, contrast_y = fit_grid(edge_profile(gray, 1))
+    if min(contrast_x, contrast_y) < MIN_GRID_CONTRAST:
+        raise CalibrationError(f"Grid lines too faint (contrast {contrast_x:.1f} x {contrast_y:.1f})")
+    gap = grid_line_width(gray, origin_x, pitch_x, 0)
+    pitch = (pitch_x + pitch_y) / 2
+    left = int(round(bx + origin_x + gap / 2))
+    top = int(round(by + origin_y + gap / 2))
+    side = int(round(GRID_SIZE * pitch))
+    tray_y = ty + th // 2
+    return {
+        "width": int(frame.shape[1]),
+        "height": int(frame.shape[0]),
+        "pitch": round(pitch, 2),
+        "board_grid_gap": gap,
+        "block_size_on_board": int(round(pitch)) - gap,
+        "board_top_left": [left, top],
+        "board_roi": [left, top, side, side],
+        "block_roi": [tx, ty, tw, th],
+        "start_blocks": [[int(round(tx + tw * (2 * slot + 1) / 6)), tray_y] for slot in range(3)],
+        "empty_board": board_is_empty(hsv, left, top, pitch),
+        "grid_contrast": round(min(contrast_x, contrast_y), 2),
+    }
+
+
+# --- Config generation ---
+def geometry_key(width, height, scale):
+    return f"{width}x{height}@{scale}x"
+
+def scale_point(point, ratio_x, ratio_y):
+    return int(round(point[0] * ratio_x)), int(round(point[1] * ratio_y))
+
+def config_attributes(base, geometry, scale, template_dir):
+    """Attribute overrides on top of base: measured geometry, plus popup buttons, tray sampling
+    and drag target settings scaled from base, since an in-game screenshot shows none of them.
+    Drop offsets learned on base's targets don't carry over, so they get a file of their own."""
+    ratio_x, ratio_y = geometry["width"] / base.width, geometry["height"] / base.height
+    base_pitch = base.block_size_on_board + base.board_grid_gap
+    pitch_ratio = geometry["pitch"] / base_pitch
+    attrs = {
+        "width": geometry["width"],
+        "height": geometry["height"],
+        "scale": scale,
+        "board_top_left": tuple(geometry["board_top_left"]),
+        "block_size_on_board": geometry["block_size_on_board"],
+        "board_grid_gap": geometry["board_grid_gap"],
+        "board_roi": tuple(geometry["board_roi"]),
+        "block_roi": tuple(geometry["block_roi"]),
+        "start_blocks": [tuple(point) for point in geometry["start_blocks"]],
+        "tray_cell_size": int(round(base.tray_cell_size * pitch_ratio)),
+        "tray_sample_step": max(1, int(round(base.tray_sample_step * pitch_ratio))),
+        "tray_sample_inset": int(round(base.tray_sample_inset * pitch_ratio)),
+        # targets step by the measured pitch
+        "drop_grid_gap": geometry["board_grid_gap"],
+        "drag_cell_spacing": round(base.drag_cell_spacing * pitch_ratio, 2),
+        "drag_size_step": round(base.drag_size_step * pitch_ratio, 2),
+        "board_template_path": os.path.join(template_dir, "screen_template.png"),
+        "block_template_path": os.path.join(template_dir, "block.png"),
+    }
+    for button in ALL_POPUP_TAPS:
+        attrs[button] = scale_point(getattr(base, button), ratio_x, ratio_y)
+    if base.drop_offset_path:
+        root, ext = os.path.splitext(base.drop_offset_path)
+        attrs["drop_offset_path"] = f"{root}_{config_key(geometry, scale)}{ext}"
+    return attrs
+
+def config_key(geometry, scale):
+    """geometry_key as a name part, e.g. 1170x2532_at_3x."""
+    return geometry_key(geometry["width"], geometry["height"], scale).replace("@", "_at_").replace(".", "_")
+
+def make_config(base, geometry, scale, template_dir):
+    return type(f"{base.__name__}_{config_key(geometry, scale)}", (base,),
+                config_attributes(base, geometry, scale, template_dir))
+
+
+# --- Cache ---
+def cache_dir_for(base, width, height, scale):
+    return os.path.join(base.geometry_cache_dir, geometry_key(width, height, scale))
+
+def calibrate(frame, scale, base):
+    """Measure an empty-board screenshot, write its geometry and templates to the cache and
+    return the generated config class."""
+    geometry = measure_geometry(frame)
+    if not geometry["empty_board"]:
+        raise CalibrationError("Calibration needs a screenshot of an empty board")
+    directory = cache_dir_for(base, geometry["width"], geometry["height"], scale)
+    os.makedirs(directory, exist_ok=True)
+    config = make_config(base, geometry, scale, directory)
+
+    cv2.imwrite(config.board_template_path, frame)
+    block = cv2.imread(base.block_template_path)
+    if block is None:
+        raise CalibrationError(f"Could not load block template {base.block_template_path}")
+    size = config.tray_cell_size
+    cv2.imwrite(config.block_template_path, cv2.resize(block, (size, size), interpolation=cv2.INTER_AREA))
+
+    data = {"version": GEOMETRY_VERSION, "base": base.__name__, "scale": scale, "geometry": geometry}
+    path = os.path.join(directory, "geometry.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+    logger.info("Calibrated %s: board %s pitch %.2f, tray %s", geometry_key(geometry["width"], geometry["height"], scale),
+                geometry["board_roi"], geometry["pitch"], geometry["block_roi"])
+    return config
+
+def load_calibrated_config(base, width, height, scale):
+    """The cached config for this screen size and scale, or None."""
+    directory = cache_dir_for(base, width, height, scale)
+    path = os.path.join(directory, "geometry.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != GEOMETRY_VERSION:
+            return None
+        return make_config(base, data["geometry"], data["scale"], directory)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Ignoring unreadable geometry %s: %s", path, e)
+        return None
+
+def device_scale(driver, frame, default):
+    """Screenshot pixels per point, from the driver's window size when it reports one."""
+    try:
+        points = driver.get_window_size()["width"]
+    except Exception:
+        return default
+    return int(round(frame.shape[1] / points)) if points else default
+
+def apply_geometry(session, frame):
+    """
+    Swap the session's config for the calibrated one matching this frame's screen: from the
+    cache, else measured now when the board is empty. Keeps the current config otherwise.
+    """
+    base = session.config
+    scale = device_scale(session.driver, frame, base.scale)
+    height, width = frame.shape[:2]
+    config = load_calibrated_config(base, width, height, scale)
+    if config is None:
+        try:
+            config = calibrate(frame, scale, base)
+        except CalibrationError as e:
+            logger.warning("No geometry for %s, keeping %s: %s", geometry_key(width, height, scale), base.__name__, e)
+            return base
+    session.config = config
+    return config
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("screenshot", help="full screenshot of an empty board")
+    parser.add_argument("--scale", type=int, default=3, help="screenshot pixels per point")
+    parser.add_argument("--target", type=find_target, default=13, help="config id or name to derive from")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    frame = cv2.imread(args.screenshot)
+    if frame is None:
+        parser.error(f"could not read {args.screenshot}")
+    try:
+        config = calibrate(frame, args.scale, CONFIGS[args.target])
+    except CalibrationError as e:
+        logger.error("%s", e)
+        return 1
+    for name in ("board_top_left", "block_size_on_board", "board_grid_gap", "board_roi", "block_roi", "start_blocks",
+                 "tray_cell_size", "drop_grid_gap", "drag_cell_spacing", "drag_size_step", "drop_offset_path",
+                 "board_template_path", "block_template_path"):
+        print(f"{name} = {getattr(config, name)!r}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
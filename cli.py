@@ -0,0 +1,186 @@
+"""
+One entry point for playing and the offline tools, with the config picked by name or id.
+
+    python cli.py play --config iphone13
+    python cli.py play --fake test_data --set runner=pipelined --duration 30 --latency 0.3 0.15
+    python cli.py detect test_data/test_2.PNG
+    python cli.py bench --no-allocations
+    python cli.py calibrate empty_board.png --scale 3
+    python cli.py replay cache/recordings --strategies greedy
+
+Each subcommand imports only what it runs: Appium loads only to connect to a phone, and
+matplotlib only for debug plots. --startup-report breaks the startup time down by import.
+"""
+import time
+
+STARTED = time.perf_counter()  # before the other imports, so the startup report covers them
+
+import argparse
+import importlib
+import json
+import logging
+import os
+import sys
+import threading
+from config import find_target, parse_setting
+
+logger = logging.getLogger(__name__)
+
+# Subcommands handed to a tool's own main(), with --target set from --config
+TOOLS = {"bench": "bench_suite", "calibrate": "calibration", "replay": "replay"}
+# Optional heavy dependencies the startup report checks were not loaded
+LAZY_MODULES = ("matplotlib", "appium", "selenium")
+
+# (module, seconds) of the imports timed_import made, in order
+IMPORT_TIMES = []
+
+
+# --- Startup ---
+def timed_import(name):
+    """Import a module, recording how long it took, including modules it loads first."""
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    IMPORT_TIMES.append((name, time.perf_counter() - start))
+    return module
+
+def report_startup(show=False):
+    """Log the time since the process reached cli.py; with show, print it per import."""
+    total = time.perf_counter() - STARTED
+    logger.info("Started in %.0f ms", total * 1000)
+    if show:
+        for name, seconds in IMPORT_TIMES:
+            print(f"import {name:<22}{seconds * 1000:>8.1f} ms")
+        print(f"{'ready':<29}{total * 1000:>8.1f} ms")
+        loaded = [name for name in LAZY_MODULES if name in sys.modules]
+        print(f"optional modules loaded: {', '.join(loaded) or 'none'}")
+    return total
+
+def session_settings(args):
+    return dict(parse_setting(item) for item in args.set)
+
+
+# --- Subcommands ---
+def play(args):
+    auto_ios = timed_import("auto_ios")
+    from context import set_context
+    from solver import stop_solver_pool
+    from telemetry import setup_logging
+    session = set_context(args.config, **session_settings(args))
+    cfg = session.config
+    setup_logging(cfg.log_level)
+    report_startup(args.startup_report)
+    if args.duration:
+        timer = threading.Timer(args.duration, session.stop)
+        timer.daemon = True
+        timer.start()
+
+    try:
+        if args.fake:
+            from fake_driver import FakeDriver
+            screenshot_latency, action_latency = args.latency
+            session.driver = FakeDriver(args.fake, cfg.bundle_id, loop=True, screenshot_latency=screenshot_latency,
+                                        action_latency=action_latency)
+        else:
+            session.driver = auto_ios.connect_driver(cfg, args.server or auto_ios.APPIUM_SERVER_URL)
+            logger.info("Appium driver initialized successfully. App launched on phone.")
+        auto_ios.run_session(session)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.exception("An error occurred: %s", e)
+        return 1
+    finally:
+        if session.driver is not None:
+            logger.info("Quitting driver session.")
+            session.driver.quit()
+        stop_solver_pool()
+        logger.info("%s: %s", session.name, session.stats)
+    return 0
+
+def image_paths(paths):
+    """Files as given, directories expanded to the screenshots they hold."""
+    from screen_state import IMAGE_EXTENSIONS
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(os.path.join(path, name) for name in os.listdir(path)
+                              if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            yield path
+
+def detect(args):
+    board_detection = timed_import("board_detection")
+    block_detection = timed_import("block_detection")
+    import cv2
+    from context import set_context
+    from shape_registry import load_registry
+    from telemetry import setup_logging
+    cfg = set_context(args.config, **session_settings(args)).config
+    setup_logging(cfg.log_level)
+    load_registry(cfg.shape_registry_path)
+    report_startup(args.startup_report)
+
+    failed = 0
+    for path in image_paths(args.images):
+        frame = cv2.imread(path)
+        if frame is None:
+            logger.error("Could not read %s", path)
+            failed += 1
+            continue
+        start = time.perf_counter()
+        board, _ = board_detection.get_current_board(frame)
+        board_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        shapes = [[shape, int(shape_loc)] for shape, shape_loc in block_detection.get_block_shapes(frame)]
+        tray_ms = (time.perf_counter() - start) * 1000
+        if args.json:
+            print(json.dumps({"image": path, "board": board, "shapes": shapes,
+                              "board_ms": round(board_ms, 3), "tray_ms": round(tray_ms, 3)}))
+            continue
+        print(f"{path}  board {board_ms:.2f} ms  tray {tray_ms:.2f} ms")
+        for row in board or ():
+            print("  " + "".join("#" if cell else "." for cell in row))
+        for shape, shape_loc in shapes:
+            print(f"  tray {shape_loc:>2}: {shape}")
+    return 1 if failed else 0
+
+def run_tool(args, argv):
+    module = timed_import(TOOLS[args.command])
+    report_startup(args.startup_report)
+    return module.main(["--target", str(args.config)] + argv)
+
+COMMANDS = {"play": play, "detect": detect}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", type=find_target, default=13, help="config name or id, e.g. iphone13")
+    common.add_argument("--startup-report", action="store_true", help="print the startup time per import")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    play_parser = commands.add_parser("play", parents=[common], help="play on a phone, or on screenshots with --fake")
+    play_parser.add_argument("--fake", metavar="DIR", help="play on the screenshots in DIR instead of a phone")
+    play_parser.add_argument("--latency", type=float, nargs=2, default=(0.0, 0.0), metavar=("SCREENSHOT", "ACTION"),
+                             help="with --fake, seconds per screenshot and per gesture request, as on a phone")
+    play_parser.add_argument("--server", help="Appium server URL")
+    play_parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    detect_parser = commands.add_parser("detect", parents=[common], help="print the board and tray of screenshots")
+    detect_parser.add_argument("images", nargs="+", help="screenshots, or directories of them")
+    detect_parser.add_argument("--json", action="store_true", help="one JSON line per screenshot")
+    for command_parser in (play_parser, detect_parser):
+        command_parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                                    help="config override, e.g. vision_scale=3 (repeatable)")
+    for command, module in TOOLS.items():
+        # No help of its own: --help and every other option go to the tool
+        commands.add_parser(command, parents=[common], add_help=False, help=f"{module}.py; see {command} --help")
+
+    args, rest = parser.parse_known_args(argv)
+    if args.command in TOOLS:
+        return run_tool(args, rest)
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 
 # config.py
+import json
 
 class Iphone13:
     width = 1170
@@ -8,6 +9,9 @@ class Iphone13:
     device_name = "< your device name >"
     ios_version = "< your ios version >"
     device_id = '< your device id >'
+    bundle_id = "com.puzzle.sea.block1010"
+    # WebDriverAgent port; phones driven from one host (supervisor.py) need one each
+    wda_local_port = 8100
 
     # pop up ads
     pop_up_high_close = (1086, 1247)
@@ -23,8 +27,15 @@ class Iphone13:
 
     # board top left
     board_top_left = (78, 664)
-    # block size
+    # block size, and the grid line between neighbouring cells
     block_size_on_board = 100
+    board_grid_gap = 2
+    # drag targets (auto_ios.compute_target_pixel): the grid line stepped over per board cell
+    # (1 rather than board_grid_gap here; drop offsets were learned with it), the spacing
+    # between the cells of a piece being dragged, and the shift per cell a piece is short of 5
+    drop_grid_gap = 1
+    drag_cell_spacing = 15
+    drag_size_step = 2
 
     # candidate blocks
     start_blocks = [(250, 1900), (585, 1900), (915, 1900)]
@@ -33,9 +44,110 @@ class Iphone13:
     board_roi = (78, 664, 1015, 1015)
     block_roi = (74, 1754, 1020, 288)
 
+    # tray reader: "template" runs matchTemplate, "sampling" reads a coarse pixel lattice
+    # and falls back to template matching when the result is not a known piece
+    tray_reader = "sampling"
+    tray_cell_size = 56
+    tray_sample_step = 4
+    tray_color_threshold = 80
+    tray_sample_inset = 24
+
     block_template_path = "templates/block_3.png"
     board_template_path = "templates/screen_template.jpeg"
     current_screen_template_path = "templates/current_screen.png"
+    # write every captured frame to current_screen_template_path
+    debug_save_frames = False
+
+    # gestures: seconds held before release, and between gestures sent in one batch
+    tap_pause = 0.05
+    drag_pause = 0.5
+    gesture_gap = 0.05
+
+    # screen state: reference captures live in screen_reference_dir/<state>/*.png
+    # (in_game, ad_popup, level_up, diamond_offer, game_over, daily_reward). None ship with
+    # the repo; until some are captured, only the board template is indexed and every popup
+    # goes to the blind sweep
+    screen_reference_dir = "templates/screens"
+    screen_hash_size = 16
+    # mean gray-level difference above which a frame counts as an unknown screen. The ranges
+    # overlap: game screens measure up to ~28 and popups dimming the game by 25% measure 25-39.
+    # Popups that still pass as in-game show no playable tray, which also ends in the sweep
+    screen_max_distance = 30.0
+
+    # runner: "sequential" (auto_play) or "pipelined" (capture, vision/solve and gestures overlap)
+    runner = "sequential"
+    # pipelined: seconds after a drop batch should have played out on screen before capturing
+    # resumes while its request is still in flight (drop animations need a moment)
+    pipeline_capture_delay = 0.1
+
+    # reduced-resolution vision: board and tray detection run on frames scaled down by
+    # vision_scale (e.g. 3 = point resolution), optionally cropped to the two ROIs first
+    vision_scale = 1
+    vision_roi_only = False
+    # where the image detection reads sits in the screenshot; set on derived vision configs
+    frame_origin = (0, 0)
+    frame_factor = 1
+
+    # frame stability: capture again until board/tray thumbnails stop changing
+    stability_thumb_size = 32
+    stability_threshold = 2.0
+    # a thumbnail pixel that moved by more than this makes the screen differ from the last
+    # decision; one board cell or tray piece moves several by 60+, encoding noise by ~4
+    stability_pixel_threshold = 24
+    stability_settle_frames = 1
+    stability_poll_interval = 0.05
+    setup_time_budget = 60.0
+
+    # placement engine for the greedy solver: "python" or "numpy" (lines only) or
+    # "heuristic" (lines plus the board features in evaluation.py)
+    placement_engine = "python"
+
+    # solver: "greedy" places one shape at a time, "lookahead" searches the whole tray
+    solver_mode = "greedy"
+    solver_node_budget = 200000
+    solver_time_budget = 0.5
+    # lookahead worker processes; 1 searches in-process
+    solver_workers = 1
+    # lookahead leaf value: "cells" (fewest filled cells) or "heuristic" (evaluation.py features)
+    solver_evaluation = "cells"
+    # overrides for evaluation.DEFAULT_WEIGHTS, e.g. {"holes": -4.0}
+    eval_weights = {}
+
+    # simulator: tray weights as {shape key: weight}; None deals every base piece equally often
+    sim_piece_weights = None
+
+    # drop calibration: learned offsets per (shape, cell); a missed drop is retried on a
+    # drop_search_step grid within drop_search_radius px of the last offset that landed
+    drop_search_step = 10
+    drop_search_radius = 50
+
+    # logging: DEBUG shows every detection and drag; WARNING keeps the hot loop quiet
+    log_level = "INFO"
+    # telemetry: per-loop stage timings as rotating JSONL, plus Prometheus text for the
+    # node exporter textfile collector; None disables either output
+    trace_path = "cache/trace.jsonl"
+    trace_sample_rate = 1.0  # fraction of loops written to the trace; metrics count every loop
+    trace_max_bytes = 5 * 1024 * 1024
+    trace_backup_count = 3
+    metrics_path = "cache/auto_play.prom"
+    metrics_interval = 10.0
+    metrics_labels = {}  # e.g. {"device": "<udid>"}; supervisor.py labels each phone
+    # session recording (recorder.py, replayed by replay.py): board/tray crops, detections,
+    # moves and timings of every played loop, in chunks of record_chunk_size loops; the oldest
+    # chunks are deleted past record_max_bytes. record_scale keeps every n-th pixel of the crops
+    record_dir = None  # e.g. "cache/recordings"; None disables recording
+    record_chunk_size = 50
+    record_max_bytes = 1024 ** 3
+    record_scale = 1
+
+    # geometry calibration (calibration.py): on start, swap in the board/tray geometry measured
+    # for the phone's screen size and scale, measuring it first if the board is empty
+    auto_geometry = False
+    geometry_cache_dir = "cache/geometry"
+
+    # cache
+    shape_registry_path = "cache/shape_registry.json"
+    drop_offset_path = "cache/drop_offsets_iphone13.json"
 
 
 
@@ -49,4 +161,24 @@ CONFIGS = {
 }
 
 
+def find_target(name):
+    """Target id of a config given by id ('13') or class name ('iphone13', any case)."""
+    key = str(name).strip()
+    if key.isdigit() and int(key) in CONFIGS:
+        return int(key)
+    for target, config in CONFIGS.items():
+        if config.__name__.lower() == key.lower():
+            return target
+    choices = ", ".join(f"{config.__name__} ({target})" for target, config in CONFIGS.items())
+    raise ValueError(f"Unknown config {name!r}; choose from {choices}")
+
+def parse_setting(item):
+    """'vision_scale=3' -> ('vision_scale', 3); values that are not JSON stay strings."""
+    key, _, value = item.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
 
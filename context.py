@@ -1,20 +1,90 @@
+import os
+import threading
 from config import CONFIGS
 
-# Global variable to hold the current context
+# Process-wide default session, used by threads that have no session of their own
 CURRENT_CONTEXT = {
-    "target": None,
-    "config": None
+    "session": None,
 }
+# Session bound to the running thread; takes precedence over CURRENT_CONTEXT
+_BOUND = threading.local()
 
-def set_context(target_id: int):
-    """Sets global context based on target_id."""
-    if target_id not in CONFIGS:
-        raise ValueError(f"No config found for target {target_id}")
-    CURRENT_CONTEXT["target"] = target_id
-    CURRENT_CONTEXT["config"] = CONFIGS[target_id]
+class TemplateCache:
+    """Lazily built template artifacts, rebuilt when the source file's mtime changes."""
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, name, path, build):
+        mtime = os.path.getmtime(path)
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != path or entry[1] != mtime:
+            entry = self.entries[name] = (path, mtime, build(path))
+        return entry[2]
+
+    def clear(self):
+        self.entries.clear()
+
+
+class DeviceSession:
+    """
+    Everything one phone needs: its config, driver, template cache and run stats.
+    Code on a thread the session is bound to sees it through get_context(), so several
+    devices can play from one process.
+    """
+    def __init__(self, target_id, driver=None, name=None, **overrides):
+        if target_id not in CONFIGS:
+            raise ValueError(f"No config found for target {target_id}")
+        base = CONFIGS[target_id]
+        self.target = target_id
+        self.name = name or str(target_id)
+        # A subclass per session, so overrides (udid, cache paths) stay out of other sessions
+        self.config = type(f"{base.__name__}_{self.name}", (base,), overrides) if overrides else base
+        self.driver = driver
+        self.templates = TemplateCache()
+        self.stats = {"loops": 0, "popups": 0, "drops": 0, "errors": 0}
+        # False when a supervisor starts and stops the solver pool for every session
+        self.owns_solver_pool = True
+        self.stop_event = threading.Event()
+
+    def __repr__(self):
+        return f"DeviceSession({self.name!r}, target={self.target})"
+
+    def bind(self):
+        """Make this the session of the calling thread."""
+        _BOUND.session = self
+        return self
+
+    def unbind(self):
+        if getattr(_BOUND, "session", None) is self:
+            _BOUND.session = None
+
+    def count(self, name, amount=1):
+        self.stats[name] = self.stats.get(name, 0) + amount
+
+    @property
+    def stopped(self):
+        return self.stop_event.is_set()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def set_context(target_id: int, **overrides):
+    """Sets the process-wide default session based on target_id (and config overrides) and returns it."""
+    CURRENT_CONTEXT["session"] = DeviceSession(target_id, **overrides)
+    return CURRENT_CONTEXT["session"]
+
+def current_session():
+    """The session bound to this thread, else the process-wide one."""
+    session = getattr(_BOUND, "session", None) or CURRENT_CONTEXT["session"]
+    if session is None:
+        raise RuntimeError("Context has not been set.")
+    return session
 
 def get_context():
     """Returns current config."""
-    if CURRENT_CONTEXT["config"] is None:
-        raise RuntimeError("Context has not been set.")
-    return CURRENT_CONTEXT["config"]
+    return current_session().config
+
+def get_template_cache():
+    """Returns the template cache owned by the current session."""
+    return current_session().templates
@@ -0,0 +1,140 @@
+import itertools
+import json
+import logging
+import os
+from bitboard import board_to_bits, clear_full_lines_bits, shape_to_bits
+from shape_registry import shape_key
+
+logger = logging.getLogger(__name__)
+
+DROP_TABLE_VERSION = 1
+
+
+def search_offsets(step=10, radius=50):
+    """Offsets within radius of (0, 0) on a step grid, nearest first."""
+    span = range(-radius, radius + 1, step)
+    offsets = [(dx, dy) for dx in span for dy in span]
+    offsets.sort(key=lambda o: (o[0] * o[0] + o[1] * o[1], abs(o[1]), o))
+    return offsets
+
+
+def landed_moves(before, moves, after):
+    """
+    Which drops of a batch actually landed, judged by replaying every landed/missed
+    combination on the previous board. Returns a tuple of bools (most landings first),
+    or None when no combination explains the new board.
+    """
+    before_bits = clear_full_lines_bits(board_to_bits(before))
+    after_bits = board_to_bits(after)
+    for outcome in sorted(itertools.product((True, False), repeat=len(moves)), key=lambda o: -sum(o)):
+        bits = before_bits
+        for landed, (shape, pos) in zip(outcome, moves):
+            if not landed:
+                continue
+            shape_bits = shape_to_bits(shape, pos[0], pos[1])
+            if bits & shape_bits:
+                break
+            bits = clear_full_lines_bits(bits | shape_bits)
+        else:
+            if bits == after_bits:
+                return outcome
+    return None
+
+
+class DropOffsetTable:
+    """
+    Pixel corrections on top of compute_target_pixel, learned per (shape, target cell).
+    A drop that missed is retried at the next offset around the last known-good one for
+    that shape, instead of sweeping the whole grid.
+    """
+    def __init__(self, path=None, step=10, radius=50):
+        self.path = path
+        self.cells = {}    # "shape_key@row,col" -> [dx, dy]
+        self.shapes = {}   # shape_key -> last good [dx, dy] for any cell
+        self.last_good = (0, 0)
+        self.attempts = {}  # cell key -> misses since its last success (not persisted)
+        self.offsets = search_offsets(step, radius)
+
+    @staticmethod
+    def cell_key(shape, pos):
+        return f"{shape_key(shape)}@{pos[0]},{pos[1]}"
+
+    def base_offset(self, shape, pos):
+        """Best known offset: this cell, else this shape anywhere, else the last drop that landed."""
+        learned = self.cells.get(self.cell_key(shape, pos)) or self.shapes.get(shape_key(shape))
+        return tuple(learned) if learned else self.last_good
+
+    def offset_for(self, shape, pos):
+        base_x, base_y = self.base_offset(shape, pos)
+        attempt = self.attempts.get(self.cell_key(shape, pos), 0)
+        if attempt >= len(self.offsets):
+            # Neighbourhood exhausted: start over from the known-good offset.
+            self.attempts.pop(self.cell_key(shape, pos), None)
+            attempt = 0
+        dx, dy = self.offsets[attempt]
+        return base_x + dx, base_y + dy
+
+    def record(self, shape, pos, offset, landed):
+        key = self.cell_key(shape, pos)
+        if not landed:
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+            return
+        self.attempts.pop(key, None)
+        offset = [int(offset[0]), int(offset[1])]
+        changed = (self.cells.get(key) != offset or self.shapes.get(shape_key(shape)) != offset
+                   or list(self.last_good) != offset)
+        self.cells[key] = offset
+        self.shapes[shape_key(shape)] = offset
+        self.last_good = tuple(offset)
+        if changed:
+            self.save()
+
+    def verify(self, before, drops, after):
+        """
+        Compare the board detected after a gesture batch with what the drops should have made.
+        drops is a list of (shape, pos, offset). Returns the landed flags, or None if unexplained.
+        """
+        outcome = landed_moves(before, [(shape, pos) for shape, pos, _ in drops], after)
+        if outcome is None:
+            logger.info("Board changed in an unexpected way, not learning from it")
+            return None
+        for landed, (shape, pos, offset) in zip(outcome, drops):
+            self.record(shape, pos, offset, landed)
+        logger.debug("%d/%d drops landed", sum(outcome), len(outcome))
+        return outcome
+
+    # --- Persistence ---
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") == DROP_TABLE_VERSION:
+                self.cells = data["cells"]
+                self.shapes = data["shapes"]
+                self.last_good = tuple(data["last_good"])
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable table %s: %s", self.path, e)
+        return self
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "version": DROP_TABLE_VERSION,
+            "cells": self.cells,
+            "shapes": self.shapes,
+            "last_good": list(self.last_good),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+
+def load_drop_table(cfg):
+    return DropOffsetTable(cfg.drop_offset_path, cfg.drop_search_step, cfg.drop_search_radius).load()
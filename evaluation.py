@@ -0,0 +1,213 @@
+from bitboard import BOARD_COLS, BOARD_ROWS, COL_MASKS, FULL_MASK, LINE_MASKS, ROW_MASKS, board_to_bits, count_cells
+from shape_registry import get_placements
+
+# Feature weights; every feature except near_full is a penalty. Overridden per config by
+# configure_evaluation(cfg.eval_weights).
+DEFAULT_WEIGHTS = {
+    "filled": -1.0,        # occupied cells
+    "holes": -3.0,         # empty cells walled in on three sides
+    "isolated": -6.0,      # empty cells walled in on all four sides
+    "roughness": -0.5,     # filled/empty transitions along rows and columns
+    "near_full": 2.0,      # rows/columns one or two cells short of clearing
+    "blocked_pieces": -15.0,  # probe pieces with nowhere left to go
+    "lines": 10.0,         # lines cleared by the move itself (placement engine only)
+}
+
+# Large pieces (rows, cols) checked for "blocked_pieces".
+FIT_PROBES = ((3, 3), (1, 5), (5, 1))
+NEAR_FULL_MIN = BOARD_COLS - 2
+# Fill count -> 1 when the line is near full
+NEAR_FULL = [int(NEAR_FULL_MIN <= filled < BOARD_COLS) for filled in range(BOARD_COLS + 1)]
+LINE_INDEX = {mask: i for i, mask in enumerate(LINE_MASKS)}
+# Largest value each board feature can take; features never go below 0
+FEATURE_MAX = {
+    "filled": BOARD_ROWS * BOARD_COLS,
+    "holes": BOARD_ROWS * BOARD_COLS,
+    "isolated": BOARD_ROWS * BOARD_COLS,
+    "roughness": BOARD_ROWS * (BOARD_COLS - 1) + BOARD_COLS * (BOARD_ROWS - 1),
+    "near_full": len(LINE_MASKS),
+    "blocked_pieces": len(FIT_PROBES),
+}
+
+EVAL_STATE = {
+    "weights": dict(DEFAULT_WEIGHTS),
+}
+
+_INNER_COLS = FULL_MASK & ~COL_MASKS[BOARD_COLS - 1]  # cells with a right-hand neighbour
+_INNER_ROWS = FULL_MASK & ~ROW_MASKS[BOARD_ROWS - 1]  # cells with a neighbour below
+# Cells a piece `cols` wide can be anchored at without running off the right edge.
+ANCHOR_COLS = {cols: sum(COL_MASKS[:BOARD_COLS - cols + 1]) for cols in range(1, BOARD_COLS + 1)}
+
+# Placement bits -> the masks its incremental feature updates need (placement_masks).
+PLACEMENT_MASKS = {}
+
+
+def configure_evaluation(weights=None):
+    EVAL_STATE["weights"] = {**DEFAULT_WEIGHTS, **(weights or {})}
+    return EVAL_STATE["weights"]
+
+
+# --- Features ---
+def blocked_sides(bits):
+    """Per-direction masks of cells whose left/right/up/down neighbour is filled or the wall."""
+    left = ((bits << 1) & FULL_MASK & ~COL_MASKS[0]) | COL_MASKS[0]
+    right = (bits >> 1 & ~COL_MASKS[BOARD_COLS - 1]) | COL_MASKS[BOARD_COLS - 1]
+    up = ((bits << BOARD_COLS) & FULL_MASK) | ROW_MASKS[0]
+    down = (bits >> BOARD_COLS) | ROW_MASKS[BOARD_ROWS - 1]
+    return left, right, up, down
+
+def cavity_counts(bits):
+    """(holes, isolated): empty cells blocked on exactly three sides / on all four."""
+    empty = ~bits & FULL_MASK
+    left, right, up, down = blocked_sides(bits)
+    isolated = empty & left & right & up & down
+    three = empty & ((left & right & (up | down)) | (up & down & (left | right)))
+    return count_cells(three & ~isolated), count_cells(isolated)
+
+def roughness(bits):
+    return count_cells((bits ^ (bits >> 1)) & _INNER_COLS) + count_cells((bits ^ (bits >> BOARD_COLS)) & _INNER_ROWS)
+
+def line_counts(bits):
+    """Fill counter per row then per column, in LINE_MASKS order."""
+    return [count_cells(bits & mask) for mask in LINE_MASKS]
+
+def near_full_count(counts):
+    return sum(1 for filled in counts if NEAR_FULL_MIN <= filled < BOARD_COLS)
+
+def rect_anchors(empty, rows, cols):
+    """Mask of top-left cells where a rows x cols rectangle of empty cells starts."""
+    run = empty
+    for _ in range(cols - 1):
+        run &= run >> 1
+    run &= ANCHOR_COLS[cols]  # drop runs that wrapped into the next row
+    for _ in range(rows - 1):
+        run &= run >> BOARD_COLS
+    return run
+
+def blocked_pieces(bits):
+    empty = ~bits & FULL_MASK
+    return sum(1 for rows, cols in FIT_PROBES if not rect_anchors(empty, rows, cols))
+
+def placement_masks(shape_bits, lines):
+    """
+    (line_cells, cells, sides, edges, edge_count, kills) for a placement, cached:
+    line_cells holds (counter index, cells added, line) per touched line, sides the
+    blocked_sides bits the placed cells set on their neighbours, edges the neighbours per
+    direction, edge_count how many (cell, neighbour) pairs those are, and kills per
+    FIT_PROBES entry the anchors whose rectangle the placement covers.
+    """
+    masks = PLACEMENT_MASKS.get(shape_bits)
+    if masks is None:
+        line_cells = tuple((LINE_INDEX[line], count_cells(shape_bits & line), line) for line in lines)
+        sides = ((shape_bits << 1) & FULL_MASK & ~COL_MASKS[0], shape_bits >> 1 & ~COL_MASKS[BOARD_COLS - 1],
+                 (shape_bits << BOARD_COLS) & FULL_MASK, shape_bits >> BOARD_COLS)
+        edges = tuple(side & ~shape_bits for side in sides)
+        kills = []
+        for rows, cols in FIT_PROBES:
+            kill = shape_bits
+            for _ in range(cols - 1):
+                kill |= kill >> 1
+            for _ in range(rows - 1):
+                kill |= kill >> BOARD_COLS
+            kills.append(kill)
+        masks = PLACEMENT_MASKS[shape_bits] = (line_cells, count_cells(shape_bits), sides, edges,
+                                               sum(count_cells(edge) for edge in edges), tuple(kills))
+    return masks
+
+def board_features(bits, counts=None):
+    counts = line_counts(bits) if counts is None else counts
+    holes, isolated = cavity_counts(bits)
+    return {
+        "filled": sum(counts[:BOARD_ROWS]),
+        "holes": holes,
+        "isolated": isolated,
+        "roughness": roughness(bits),
+        "near_full": near_full_count(counts),
+        "blocked_pieces": blocked_pieces(bits),
+    }
+
+def score_features(features, weights):
+    return sum(weights[name] * value for name, value in features.items())
+
+
+# --- Solver leaf evaluation ---
+class LeafEval:
+    """
+    Weighted board features as a solver leaf value; a class so it pickles into solver workers.
+    Not incremental: the solver hands over only the leaf bits, so every feature is recomputed.
+    """
+    def __init__(self, weights):
+        self.weights = weights
+
+    def __call__(self, bits):
+        return score_features(board_features(bits), self.weights)
+
+def make_leaf_eval(weights=None):
+    """
+    (evaluate, leaf_upper) for solver.solve_tray. leaf_upper is the best value evaluate can
+    return, the optimistic bound the search needs: every feature with a positive weight at
+    its maximum and every other one at 0, whichever weights a config overrides.
+    """
+    weights = {**EVAL_STATE["weights"], **(weights or {})}
+    leaf_upper = sum(max(0.0, weights[name]) * feature_max for name, feature_max in FEATURE_MAX.items())
+    return LeafEval(weights), leaf_upper
+
+
+# --- Placement engine ---
+def find_best_placement_eval(board_or_bits, shape):
+    """
+    Placement engine with the same (position, score) contract as find_best_placement, scoring
+    lines cleared plus the weighted board features after the move. Features are updated from
+    the board's: fill counters for the lines a placement touches, cavities from the sides its
+    cells block, roughness from its edges and probe fits from the anchors it covers. A move
+    that clears lines recomputes everything, since a cleared row changes every column.
+    """
+    weights = EVAL_STATE["weights"]
+    w_filled, w_holes, w_isolated = weights["filled"], weights["holes"], weights["isolated"]
+    w_rough, w_near, w_blocked, w_lines = (weights["roughness"], weights["near_full"], weights["blocked_pieces"],
+                                           weights["lines"])
+    bits = board_or_bits if isinstance(board_or_bits, int) else board_to_bits(board_or_bits)
+    counts = line_counts(bits)
+    base_near = near_full_count(counts)
+    base_filled = sum(counts[:BOARD_ROWS])
+    empty = ~bits & FULL_MASK
+    left, right, up, down = blocked_sides(bits)
+    base_rough = roughness(bits)
+    # One per FIT_PROBES entry, unpacked so the probe check below stays three plain tests
+    square_anchors, row_anchors, col_anchors = (rect_anchors(empty, rows, cols) for rows, cols in FIT_PROBES)
+
+    best_score = None
+    best_position = None
+    for row, col, shape_bits, lines in get_placements(shape):
+        if bits & shape_bits:
+            continue
+        line_cells, cells, sides, edges, edge_count, kills = placement_masks(shape_bits, lines)
+        cleared = 0
+        lines_cleared = 0
+        near = base_near
+        for i, added, line in line_cells:
+            before = counts[i]
+            after = before + added
+            if after == BOARD_COLS:
+                cleared |= line
+                lines_cleared += 1
+            near += NEAR_FULL[after] - NEAR_FULL[before]
+        if cleared:
+            score = score_features(board_features((bits | shape_bits) & ~cleared), weights)
+        else:
+            free = empty & ~shape_bits
+            l, r, u, d = left | sides[0], right | sides[1], up | sides[2], down | sides[3]
+            isolated = free & l & r & u & d
+            holes = count_cells(free & ((l & r & (u | d)) | (u & d & (l | r))) & ~isolated)
+            # Each edge to an empty cell adds a transition, each edge to a filled one removes one
+            rough = base_rough + edge_count - 2 * (count_cells(edges[0] & bits) + count_cells(edges[1] & bits)
+                                                   + count_cells(edges[2] & bits) + count_cells(edges[3] & bits))
+            blocked = ((not square_anchors & ~kills[0]) + (not row_anchors & ~kills[1])
+                       + (not col_anchors & ~kills[2]))
+            score = (w_filled * (base_filled + cells) + w_holes * holes + w_isolated * count_cells(isolated)
+                     + w_rough * rough + w_near * near + w_blocked * blocked)
+        score += w_lines * lines_cleared
+        if best_score is None or score > best_score:
+            best_score = score
+            best_position = (row, col)
+    return best_position, (best_score if best_score is not None else -1)
@@ -0,0 +1,87 @@
+import glob
+import os
+import threading
+import time
+from gestures import W3C_ACTIONS
+from screen_state import IMAGE_EXTENSIONS
+
+
+class FakeDriver:
+    """
+    Stand-in for an Appium driver with no phone or server behind it. Screenshots come from
+    image files in order, moving on to the next one after every gesture batch, as the
+    screen would after a move; the last image repeats. Counts every call it serves.
+
+    screenshot_latency and action_latency (seconds) give it a phone's timing: a screenshot
+    shows the screen as the request starts and returns screenshot_latency later, and with
+    action_latency set a gesture batch first plays out for the pauses and moves it holds,
+    then changes the screen and answers action_latency after that.
+    """
+    def __init__(self, frames, bundle_id="com.puzzle.sea.block1010", loop=False, screenshot_latency=0.0,
+                 action_latency=0.0):
+        if isinstance(frames, str):
+            frames = sorted(path for path in glob.glob(os.path.join(frames, "*"))
+                            if path.lower().endswith(IMAGE_EXTENSIONS))
+        if not frames:
+            raise ValueError("FakeDriver needs at least one frame")
+        self.frames = list(frames)
+        self.loop = loop
+        self.screenshot_latency = screenshot_latency
+        self.action_latency = action_latency
+        self.bundle_id = bundle_id
+        self.active_app = bundle_id
+        self.index = 0
+        self.png_cache = {}
+        self.lock = threading.Lock()  # capture and gesture threads share a driver in the pipelined runner
+        self.stats = {"screenshots": 0, "action_batches": 0, "gestures": 0, "app_checks": 0, "app_restores": 0}
+
+    def get_screenshot_as_png(self):
+        with self.lock:
+            path = self.frames[self.index]
+            self.stats["screenshots"] += 1
+        png = self.png_cache.get(path)
+        if png is None:
+            with open(path, "rb") as f:
+                png = self.png_cache[path] = f.read()
+        if self.screenshot_latency:
+            time.sleep(self.screenshot_latency)
+        return png
+
+    def execute(self, command, params=None):
+        """
+        The WebDriver command hook; GestureBatcher sends its W3C actions through here. Like a
+        real driver's command executor it rejects command names it does not know.
+        """
+        if command != W3C_ACTIONS:
+            raise ValueError(f"Unrecognised command {command!r}")
+        if not params or "actions" not in params:
+            return {"value": None}
+        actions = [action for source in params["actions"] for action in source.get("actions", ())]
+        if self.action_latency:
+            time.sleep(sum(action.get("duration", 0) for action in actions) / 1000)
+        with self.lock:
+            self.stats["action_batches"] += 1
+            self.stats["gestures"] += sum(1 for action in actions if action.get("type") == "pointerUp")
+            self.advance()
+        if self.action_latency:
+            time.sleep(self.action_latency)
+        return {"value": None}
+
+    def advance(self):
+        if self.index + 1 < len(self.frames):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+
+    def execute_script(self, script, *args):
+        if script == "mobile: activeAppInfo":
+            self.stats["app_checks"] += 1
+            return {"bundleId": self.active_app}
+        return None
+
+    def activate_app(self, bundle_id):
+        self.stats["app_restores"] += 1
+        self.active_app = bundle_id
+
+    def quit(self):
+        pass
@@ -0,0 +1,31 @@
+import cv2
+import numpy as np
+import telemetry
+from context import get_context
+
+
+def load_image(image):
+    """Accept either an already decoded BGR frame or a path to one on disk."""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.imread(image)
+
+def decode_frame(png_bytes):
+    return cv2.imdecode(np.frombuffer(png_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def capture_frame(driver):
+    """
+    Grab a screenshot straight into memory and decode it once.
+    The frame is only written to disk when debug_save_frames is enabled.
+    """
+    with telemetry.span("screenshot"):
+        png_bytes = driver.get_screenshot_as_png()
+    telemetry.count("screenshots")
+    with telemetry.span("decode"):
+        frame = decode_frame(png_bytes)
+    if frame is None:
+        raise RuntimeError("Could not decode screenshot")
+    cfg = get_context()
+    if cfg.debug_save_frames:
+        cv2.imwrite(cfg.current_screen_template_path, frame)
+    return frame
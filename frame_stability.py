@@ -0,0 +1,72 @@
+import cv2
+import numpy as np
+
+SETTLED = "settled"      # stopped changing and differs from the last decision: run detection
+CHANGED = "changed"      # changed since the last decision but still animating: capture again
+UNCHANGED = "unchanged"  # same as the frame the last decision was made on: skip detection
+
+
+class FrameStabilityDetector:
+    """
+    Tracks tiny grayscale thumbnails of the board and tray ROIs across consecutive frames
+    to tell when clear/drop animations have settled. Settling compares the mean difference
+    of consecutive thumbnails; matching the last decision needs every pixel within
+    pixel_threshold, since one placed cell barely moves the mean.
+    """
+    def __init__(self, rois, thumb_size=32, threshold=2.0, settle_frames=1, pixel_threshold=24):
+        self.rois = rois
+        self.thumb_size = thumb_size
+        self.threshold = threshold
+        self.settle_frames = settle_frames
+        self.pixel_threshold = pixel_threshold
+        self.previous = None
+        self.decision = None
+        self.decision_result = None
+        self.decision_frame = None
+        self.stable_count = 0
+        self.frames = 0
+
+    def thumbnail(self, frame):
+        parts = []
+        for x, y, w, h in self.rois:
+            # Striding first keeps the resize input tiny
+            step = max(1, min(w, h) // (self.thumb_size * 2))
+            roi = frame[y:y + h:step, x:x + w:step]
+            small = cv2.resize(roi, (self.thumb_size, self.thumb_size), interpolation=cv2.INTER_AREA)
+            parts.append(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY))
+        return np.hstack(parts).astype(np.int16)
+
+    def difference(self, a, b):
+        return float(np.mean(np.abs(a - b)))
+
+    def changed_pixels(self, a, b):
+        return int(np.count_nonzero(np.abs(a - b) > self.pixel_threshold))
+
+    def update(self, frame):
+        self.frames += 1
+        thumb = self.thumbnail(frame)
+        previous, self.previous = self.previous, thumb
+
+        if previous is not None and self.difference(previous, thumb) > self.threshold:
+            self.stable_count = 0
+            return CHANGED
+        self.stable_count += 1
+
+        if self.decision is not None and not self.changed_pixels(self.decision, thumb):
+            return UNCHANGED
+        if previous is None or self.stable_count >= self.settle_frames:
+            return SETTLED
+        return CHANGED
+
+    def mark_decision(self, result=None, frame=None):
+        """Remember the latest frame (and what was detected on it) as the one acted upon."""
+        self.decision = self.previous
+        self.decision_result = result
+        self.decision_frame = frame
+
+    def reset(self):
+        self.previous = None
+        self.decision = None
+        self.decision_result = None
+        self.decision_frame = None
+        self.stable_count = 0
@@ -0,0 +1,71 @@
+# selenium's Command.W3C_ACTIONS, the driver command for POST /session/$id/actions
+W3C_ACTIONS = "actions"
+# Selenium's default pointerMove duration, which the drop offsets were learned with
+POINTER_MOVE_MS = 250
+
+
+def pointer_move(coord, scale):
+    return {"type": "pointerMove", "duration": POINTER_MOVE_MS, "x": int(coord[0] / scale), "y": int(coord[1] / scale),
+            "origin": "viewport"}
+
+def pointer_pause(seconds):
+    return {"type": "pause", "duration": int(seconds * 1000)}
+
+
+class GestureBatcher:
+    """
+    Queues taps and drags and sends them to Appium as a single W3C actions payload per
+    flush, instead of one HTTP round trip per gesture. Coordinates are screenshot pixels.
+    The payload is the one selenium's ActionChains builds for its default pointer, sent
+    without importing selenium.
+    """
+    def __init__(self, driver, scale, tap_pause=0.05, drag_pause=0.5, gesture_gap=0.05):
+        self.driver = driver
+        self.scale = scale
+        self.tap_pause = tap_pause
+        self.drag_pause = drag_pause
+        self.gesture_gap = gesture_gap
+        self.pending = []
+        self.round_trips = 0
+
+    def tap(self, coord, pause=None):
+        self.pending.append(("tap", coord, None, self.tap_pause if pause is None else pause))
+        return self
+
+    def drag(self, from_coord, to_coord, pause=None):
+        self.pending.append(("drag", from_coord, to_coord, self.drag_pause if pause is None else pause))
+        return self
+
+    def duration(self):
+        """Seconds the queued gestures take to play out on the device, request overhead aside."""
+        seconds = 0.0
+        for i, (kind, _, _, pause) in enumerate(self.pending):
+            moves = 2 if kind == "drag" else 1
+            seconds += (self.gesture_gap if i else 0) + moves * POINTER_MOVE_MS / 1000 + (pause or 0)
+        return seconds
+
+    def flush(self):
+        """Perform every queued gesture in one request. Returns how many were sent."""
+        if not self.pending:
+            return 0
+        gestures, self.pending = self.pending, []
+        actions = []
+        for i, (kind, start, end, pause) in enumerate(gestures):
+            if i and self.gesture_gap:
+                actions.append(pointer_pause(self.gesture_gap))  # let the game register the previous release
+            actions.append(pointer_move(start, self.scale))
+            actions.append({"type": "pointerDown", "duration": 0, "button": 0})
+            if kind == "drag":
+                actions.append(pointer_move(end, self.scale))  # Move while pressed
+            if pause:
+                actions.append(pointer_pause(pause))
+            actions.append({"type": "pointerUp", "duration": 0, "button": 0})
+        pointer = {"type": "pointer", "parameters": {"pointerType": "mouse"}, "id": "mouse", "actions": actions}
+        self.driver.execute(W3C_ACTIONS, {"actions": [pointer]})
+        self.round_trips += 1
+        return len(gestures)
+
+    def take_round_trips(self):
+        """Round trips used since the last call."""
+        round_trips, self.round_trips = self.round_trips, 0
+        return round_trips
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+# --- Batched placement scoring ---
+def _full_lines_per_anchor(line_fill, shape_fill, anchors, line_length):
+    is_full = line_fill == line_length
+    full = np.full(anchors, int(is_full.sum()), dtype=np.int32)
+    for k, added in enumerate(shape_fill):
+        full += (line_fill[k:k + anchors] + added == line_length) & ~is_full[k:k + anchors]
+    return full
+
+def placement_scores(board, shape):
+    """
+    Score every anchor of a shape in one pass.
+    Returns an (rows - shape_rows + 1, cols - shape_cols + 1) int array holding the number
+    of full lines after placement, or -1 where the shape does not fit.
+    """
+    grid = np.asarray(board, dtype=np.int32)
+    kernel = np.asarray(shape, dtype=np.int32)
+    board_rows, board_cols = grid.shape
+    shape_rows, shape_cols = kernel.shape
+    anchor_rows = board_rows - shape_rows + 1
+    anchor_cols = board_cols - shape_cols + 1
+    if anchor_rows <= 0 or anchor_cols <= 0:
+        return np.full((0, 0), -1, dtype=np.int32)
+
+    # Correlate the kernel with the occupancy grid: any overlap makes the anchor illegal.
+    overlap = np.zeros((anchor_rows, anchor_cols), dtype=np.int32)
+    for k, l in zip(*np.nonzero(kernel)):
+        overlap += grid[k:k + anchor_rows, l:l + anchor_cols]
+    legal = overlap == 0
+
+    # Line counts after placing at anchor row i only depend on i (columns likewise on j):
+    # full lines outside the shape stay full, lines under it gain the shape's cells.
+    full_rows = _full_lines_per_anchor(grid.sum(axis=1), kernel.sum(axis=1), anchor_rows, board_cols)
+    full_cols = _full_lines_per_anchor(grid.sum(axis=0), kernel.sum(axis=0), anchor_cols, board_rows)
+
+    scores = full_rows[:, None] + full_cols[None, :]
+    return np.where(legal, scores, -1)
+
+def find_best_placement_np(board, shape):
+    """NumPy counterpart of placement.find_best_placement with the same (position, score) contract."""
+    scores = placement_scores(board, shape)
+    if scores.size == 0:
+        return None, -1
+    # argmax returns the first maximum in row-major order, matching the Python scan.
+    flat = int(np.argmax(scores))
+    best_score = int(scores.flat[flat])
+    if best_score < 0:
+        return None, -1
+    return divmod(flat, scores.shape[1]), best_score
@@ -0,0 +1,320 @@
+import copy
+import logging
+import queue
+import threading
+import time
+from collections import namedtuple
+from auto_ios import (
+    dismiss_popups, drop_shape, ensure_in_game, make_gestures, plan_moves,
+)
+from block_detection import get_block_shapes
+from drop_calibration import load_drop_table
+from evaluation import configure_evaluation
+from board_detection import get_current_board
+from frame_capture import capture_frame
+from frame_stability import FrameStabilityDetector, CHANGED, UNCHANGED
+from placement import clear_full_lines, place_shape_on_board
+from recorder import make_recorder
+from screen_state import IN_GAME, UNKNOWN, build_screen_index
+from shape_registry import flush_registry, load_registry
+from solver import start_solver_pool, stop_solver_pool
+import telemetry
+from telemetry import TELEMETRY, Iteration, start_tracer, stop_tracer
+
+logger = logging.getLogger(__name__)
+
+# generation and submitted: gesture batches finished and submitted when the capture started
+FramePacket = namedtuple("FramePacket", ["frame", "generation", "submitted", "captured_at"])
+
+def put_latest(q, item):
+    """Put into a bounded queue, dropping the oldest entry instead of blocking."""
+    while True:
+        try:
+            q.put_nowait(item)
+            return
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+
+def board_after(board, plan):
+    """The board plan leaves once its moves are played and full lines cleared."""
+    for shape, _, (row, col) in plan:
+        board = clear_full_lines(place_shape_on_board(board, shape, row, col))
+    return board
+
+
+class PipelinedPlayer:
+    """
+    auto_play split into three stages that overlap:
+    a capture worker keeps fetching frames, the calling thread runs vision and the solver
+    on the newest one, and a gesture worker executes drags and popup taps.
+    While a drop batch is in flight the capture worker starts again as soon as the drops
+    should be on screen, so detecting and planning the next tray overlaps the end of the
+    batch. Frames captured before the last batch was submitted are dropped as stale.
+    Every stage thread is bound to the device session it plays for. The calling thread
+    reports one telemetry iteration per frame, folding in what the workers measured.
+    """
+    def __init__(self, session):
+        self.session = session
+        self.driver = session.driver
+        self.cfg = session.config
+        self.gestures = make_gestures(self.driver)
+        self.frames = queue.Queue(maxsize=1)
+        self.actions = queue.Queue(maxsize=1)
+        # Shuts down this run's workers; a crash ends the run, not the session, so a
+        # supervisor can start the session again
+        self.stop_event = threading.Event()
+        self.idle = threading.Event()  # set while no gestures are queued or running
+        self.idle.set()
+        self.batch_lock = threading.Lock()  # keeps idle in step with the two counters
+        self.submitted = 0  # batches handed to the gesture worker
+        self.generation = 0  # batches the gesture worker finished
+        self.batch_eta = (-1, 0.0)  # (generation, monotonic time) the running drop batch should be on screen
+        self.expected = None  # board the last drop batch should leave
+        self.speculation = None  # plan made on an in-flight frame, for a later frame to confirm
+        self.captures = 0  # screenshots taken, for round trip counts
+        self.reports = queue.SimpleQueue()  # the gesture worker's telemetry, one Iteration per batch
+        self.stats = session.stats
+        for name in ("frames", "stale", "detections", "batches", "drops", "speculative", "predicted",
+                     "plans_reused"):
+            self.stats.setdefault(name, 0)
+
+    @property
+    def running(self):
+        return not self.stop_event.is_set() and not self.session.stopped
+
+    # --- Workers ---
+    def capture_loop(self):
+        self.session.bind()
+        while self.running:
+            if not self.idle.is_set():
+                # The screen changes while gestures run: wait until the drops should be on
+                # screen, then capture while the request is still in flight
+                generation, eta = self.batch_eta
+                if generation != self.generation:
+                    self.idle.wait(timeout=0.1)
+                    continue
+                delay = eta - time.monotonic()
+                if delay > 0:
+                    self.idle.wait(timeout=min(delay, 0.1))
+                    continue
+            submitted, generation = self.submitted, self.generation
+            try:
+                self.captures += 1
+                frame = capture_frame(self.driver)
+            except Exception as e:
+                logger.warning("Capture failed: %s", e)
+                time.sleep(self.cfg.stability_poll_interval)
+                continue
+            put_latest(self.frames, FramePacket(frame, generation, submitted, time.monotonic()))
+
+    def gesture_loop(self):
+        self.session.bind()
+        while self.running:
+            try:
+                kind, payload = self.actions.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            # Stage helpers report to this thread's iteration; run() folds it into its own
+            report = TELEMETRY.iteration = Iteration(self.generation, False)
+            try:
+                if kind == "drops":
+                    for shape, shape_loc, pos, offset_x, offset_y in payload:
+                        drop_shape(shape, shape_loc, pos, offset_x, offset_y, self.gestures)
+                    self.batch_eta = (self.generation, time.monotonic() + self.gestures.duration()
+                                      + self.cfg.pipeline_capture_delay)
+                    with report.span("drags"):
+                        self.gestures.flush()
+                    report.count("drags", len(payload))
+                elif kind == "popups":
+                    # payload: classified screen state; only unknown screens need the app check
+                    if payload == UNKNOWN:
+                        ensure_in_game(self.driver)
+                    dismiss_popups(self.cfg, self.gestures, payload)
+            except Exception as e:
+                logger.warning("Gesture batch failed: %s", e, exc_info=True)
+                self.gestures.pending.clear()
+            finally:
+                TELEMETRY.iteration = None
+                report.count("round_trips", self.gestures.take_round_trips())
+                self.reports.put(report)
+                self.stats["batches"] += 1
+                with self.batch_lock:
+                    self.generation += 1
+                    if self.generation == self.submitted:
+                        self.idle.set()
+
+    def submit(self, kind, payload=None, expected=None):
+        """Queue a gesture batch; expected is the board it should leave, for in-flight frames."""
+        self.expected = expected
+        with self.batch_lock:
+            self.submitted += 1
+            self.idle.clear()
+        self.actions.put((kind, payload))
+
+    def take_reports(self, iteration):
+        """Fold the stage times and counts of finished gesture batches into iteration."""
+        while True:
+            try:
+                report = self.reports.get_nowait()
+            except queue.Empty:
+                return
+            for name, durations in report.stages.items():
+                for seconds in durations:
+                    iteration.add_time(name, seconds)
+            for name, amount in report.counts.items():
+                iteration.count(name, amount)
+
+    # --- Vision / solver stage ---
+    def decide(self, stability, frame, in_flight):
+        """
+        (board, shapes, plan) to act on, or None to wait for another frame; plan is None when
+        it still has to be made. Frames that are still changing are never detected. A settled
+        frame is detected, or reuses the last detection when nothing changed. A settled frame
+        taken while the drops are in flight is acted on at once when it shows the board they
+        should leave; otherwise it is planned ahead, and that plan is used once a frame taken
+        after the batch shows the same screen.
+        """
+        state = stability.update(frame)
+        if state == CHANGED:
+            return None  # still animating
+        if state == UNCHANGED and stability.decision_result is not None:
+            if in_flight:
+                return None  # the drops have not reached the screen yet
+            telemetry.count("detections_reused")
+            board, shapes = copy.deepcopy(stability.decision_result)
+            plan, self.speculation = self.speculation, None
+            if plan is not None:
+                self.stats["plans_reused"] += 1
+            return board, shapes, plan
+        with telemetry.span("board_detection"):
+            board, _ = get_current_board(frame)
+        with telemetry.span("block_detection"):
+            shapes = get_block_shapes(frame)
+        self.stats["detections"] += 1
+        stability.mark_decision((copy.deepcopy(board), copy.deepcopy(shapes)), frame)
+        self.speculation = None
+        if not in_flight:
+            return board, shapes, None
+        if not shapes or len(shapes) > 4:
+            return None
+        if board == self.expected:
+            self.stats["predicted"] += 1
+            return board, shapes, None
+        self.stats["speculative"] += 1
+        with telemetry.span("solve"):
+            self.speculation = plan_moves(copy.deepcopy(board), copy.deepcopy(shapes), self.cfg)
+        return None
+
+    def run(self):
+        cfg = self.cfg
+        self.session.bind()
+        load_registry(cfg.shape_registry_path)
+        configure_evaluation(cfg.eval_weights)
+        owns_pool = cfg.solver_mode == "lookahead" and self.session.owns_solver_pool
+        if owns_pool:
+            start_solver_pool(cfg.solver_workers, configure_evaluation, (cfg.eval_weights,))
+        stability = FrameStabilityDetector([cfg.board_roi, cfg.block_roi], cfg.stability_thumb_size,
+                                           cfg.stability_threshold, cfg.stability_settle_frames,
+                                           cfg.stability_pixel_threshold)
+        screen_index = build_screen_index(cfg)
+        drop_table = load_drop_table(cfg)
+        tracer = start_tracer(cfg)
+        recorder = make_recorder(cfg)
+        name = self.session.name
+        workers = [threading.Thread(target=self.capture_loop, name=f"{name}-capture", daemon=True),
+                   threading.Thread(target=self.gesture_loop, name=f"{name}-gestures", daemon=True)]
+        for worker in workers:
+            worker.start()
+
+        last_drops = None  # (board, [(shape, pos, offset)]) of the previous drop batch
+        captures = 0  # screenshots already counted as round trips
+        try:
+            while self.running:
+                try:
+                    packet = self.frames.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                iteration = tracer.begin()
+                try:
+                    self.stats["frames"] += 1
+                    self.stats["loops"] += 1
+                    if packet.submitted != self.submitted:
+                        self.stats["stale"] += 1
+                        continue
+                    in_flight = packet.generation != packet.submitted
+
+                    screen, distance = screen_index.classify(packet.frame)
+                    telemetry.record("screen", screen)
+                    telemetry.record("screen_distance", distance)
+                    if screen not in (IN_GAME, UNKNOWN):
+                        if not in_flight:
+                            self.stats["popups"] += 1
+                            self.submit("popups", screen)
+                        continue
+
+                    try:
+                        decided = self.decide(stability, packet.frame, in_flight)
+                    except Exception as e:
+                        logger.warning("Detection or planning failed: %s", e, exc_info=True)
+                        continue
+                    if decided is None:
+                        continue
+                    board, shapes, plan = decided
+                    telemetry.record("tray_shapes", len(shapes))
+                    if not shapes or len(shapes) > 4:
+                        self.submit("popups", UNKNOWN)  # no playable tray: most likely an unrecognised popup
+                        continue
+
+                    if last_drops is not None:
+                        drop_table.verify(last_drops[0], last_drops[1], board)
+                        last_drops = None
+
+                    before = copy.deepcopy(board)
+                    if plan is None:
+                        with telemetry.span("solve"):
+                            plan = plan_moves(board, shapes, cfg)
+                    if not plan:
+                        self.submit("popups", UNKNOWN)
+                        continue
+                    drops = [(shape, shape_loc, pos) + drop_table.offset_for(shape, pos)
+                             for shape, shape_loc, pos in plan]
+                    last_drops = (before, [(shape, pos, (offset_x, offset_y))
+                                           for shape, _, pos, offset_x, offset_y in drops])
+                    self.stats["drops"] += len(drops)
+                    self.submit("drops", drops, board_after(before, plan))
+                    if recorder is not None:
+                        with telemetry.span("record"):
+                            recorder.add(stability.decision_frame, before, shapes, plan, iteration.stages,
+                                         screen=screen)
+                    # Shapes first seen by this solve are saved while the drops play out
+                    flush_registry()
+                finally:
+                    # Screenshots since the last iteration, plus gesture batches that finished
+                    self.take_reports(iteration)
+                    taken = self.captures
+                    iteration.count("round_trips", taken - captures)
+                    captures = taken
+                    tracer.end(iteration)
+        finally:
+            self.stop_event.set()
+            for worker in workers:
+                worker.join(timeout=5)
+            if owns_pool:
+                stop_solver_pool()
+            if not self.reports.empty():
+                # gesture batches that finished after the last frame
+                iteration = tracer.begin()
+                self.take_reports(iteration)
+                tracer.end(iteration)
+            stop_tracer()
+            if recorder is not None:
+                recorder.close()
+            flush_registry()
+            logger.info("%s: %s", name, self.stats)
+            self.session.unbind()
+
+    def stop(self):
+        self.stop_event.set()
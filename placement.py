@@ -1,3 +1,11 @@
+import logging
+from bitboard import board_to_bits, count_full_lines_bits
+from shape_registry import get_placements
+from numpy_engine import find_best_placement_np
+from evaluation import find_best_placement_eval
+
+logger = logging.getLogger(__name__)
+
 def can_place_shape(board, shape, board_row, board_col):
     shape_rows, shape_cols = len(shape), len(shape[0])
     for i in range(shape_rows):
@@ -24,47 +32,53 @@ def count_full_lines(board):
     return full_rows + full_cols
 
 # --- Clear full rows and columns (Block Blast style) ---
+# Full rows and columns are emptied together and in place; nothing shifts like in Tetris.
 def clear_full_lines(board):
-    # Clear full rows
-    new_board = [row for row in board if not all(cell == 1 for cell in row)]
-    while len(new_board) < len(board):
-        new_board.insert(0, [0] * len(board[0]))
+    full_rows = [r for r, row in enumerate(board) if all(cell == 1 for cell in row)]
+    full_cols = [c for c in range(len(board[0])) if all(board[r][c] == 1 for r in range(len(board)))]
 
-    # Clear full columns
-    transposed = list(zip(*new_board))
-    new_transposed = [col for col in transposed if not all(cell == 1 for cell in col)]
-    while len(new_transposed) < len(board[0]):
-        new_transposed.insert(0, tuple(0 for _ in range(len(new_board))))
-
-    cleared = [list(row) for row in zip(*new_transposed)]
+    cleared = [row[:] for row in board]
+    for r in full_rows:
+        cleared[r] = [0] * len(board[0])
+    for c in full_cols:
+        for r in range(len(board)):
+            cleared[r][c] = 0
     return cleared
 
 # --- Find best placement for maximum clear ---
 def find_best_placement(board, shape):
     best_score = -1
     best_position = None
-    board_rows, board_cols = len(board), len(board[0])
-    shape_rows, shape_cols = len(shape), len(shape[0])
+    bits = board_to_bits(board)
+    base_score = count_full_lines_bits(bits)
 
-    for i in range(board_rows - shape_rows + 1):
-        for j in range(board_cols - shape_cols + 1):
-            if can_place_shape(board, shape, i, j):
-                simulated = place_shape_on_board(board, shape, i, j)
-                score = count_full_lines(simulated)
-                if score > best_score:
-                    best_score = score
-                    best_position = (i, j)
+    for row, col, shape_bits, lines in get_placements(shape):
+        if bits & shape_bits:
+            continue
+        placed = bits | shape_bits
+        score = base_score + sum(1 for line in lines if placed & line == line)
+        if score > best_score:
+            best_score = score
+            best_position = (row, col)
     return best_position, best_score
 
+PLACEMENT_ENGINES = {
+    "python": find_best_placement,
+    "numpy": find_best_placement_np,
+    # lines cleared plus weighted board features (evaluation.py); scores can be negative
+    "heuristic": find_best_placement_eval,
+}
+
 # --- Smart shape placement ---
-def smart_place_best_shape(board, shapes, verbose=True):
-    best_score = -1
+def smart_place_best_shape(board, shapes, verbose=True, engine="python"):
+    find_placement = PLACEMENT_ENGINES[engine]
+    best_score = float("-inf")
     best_pos = None
     best_shape_idx = -1
     best_shape_loc = None
 
     for idx, (shape, shape_loc) in enumerate(shapes):
-        pos, score = find_best_placement(board, shape)
+        pos, score = find_placement(board, shape)
         if pos and score > best_score:
             best_score = score
             best_pos = pos
@@ -73,11 +87,27 @@ def smart_place_best_shape(board, shapes, verbose=True):
 
     if best_pos is not None:
         if verbose:
-            print(f"✅ Placing shape[{best_shape_idx}] at {best_pos} with score {best_score}")
+            logger.debug("✅ Placing shape[%d] at %s with score %s", best_shape_idx, best_pos, best_score)
         board = place_shape_on_board(board, shapes[best_shape_idx][0], *best_pos)
         board = clear_full_lines(board)
         return board, best_shape_idx, best_shape_loc, best_pos
     else:
         if verbose:
-            print("🚫 No valid placement for any shape")
-        return board, None, None, None
\ No newline at end of file
+            logger.debug("🚫 No valid placement for any shape")
+        return board, None, None, None
+
+def plan_greedy(board, shapes, engine="python", verbose=True):
+    """
+    Place shapes one at a time with smart_place_best_shape until none fits.
+    Returns moves as (shape_idx, shape_loc, pos) in play order, like solver.solve_tray.
+    """
+    moves = []
+    remaining = list(enumerate(shapes))
+    while remaining:
+        board, idx, shape_loc, pos = smart_place_best_shape(board, [shape for _, shape in remaining], verbose, engine)
+        if idx is None:
+            break  # stop when no shapes can be placed
+        logger.debug("up_b: %s, pos: %s", board, pos)
+        moves.append((remaining[idx][0], shape_loc, pos))
+        del remaining[idx]  # remove the used shape
+    return moves
@@ -0,0 +1,259 @@
+"""
+Append-only recording of play sessions: per loop, the board and tray crops detection read,
+the detected grid and tray, the moves played and the stage timings. Loops go into chunks of
+memory-mapped .npy arrays plus a JSONL file, listed in index.json; whole chunks are deleted
+oldest first once the recording outgrows its byte budget.
+
+    <record_dir>/index.json
+    <record_dir>/000042/board.npy    (loops, h, w, 3) uint8 board crops
+                        tray.npy     (loops, h, w, 3) uint8 tray crops
+                        grid.npy     (loops, 2) uint64, the bitboard.board_to_bits mask split in two
+                        loops.jsonl  shapes, moves, timings and values of every loop
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import cv2
+import numpy as np
+from bitboard import bits_to_board, board_to_bits
+from context import get_context
+from vision_view import roi_box
+
+logger = logging.getLogger(__name__)
+
+RECORDING_VERSION = 1
+INDEX_NAME = "index.json"
+ARRAYS = ("board", "tray", "grid")
+LOW_BITS = (1 << 64) - 1
+
+
+# --- Layout ---
+def chunk_boxes(cfg, scale):
+    """
+    Full-resolution (x0, y0, x1, y1) of the board and tray crops, clipped to the screen and
+    cut to whole multiples of scale.
+    """
+    boxes = {}
+    for part, roi in (("board", cfg.board_roi), ("tray", cfg.block_roi)):
+        x0, y0, x1, y1 = roi_box(roi, scale)
+        x1, y1 = min(x1, cfg.width), min(y1, cfg.height)
+        boxes[part] = [x0, y0, x1 - (x1 - x0) % scale, y1 - (y1 - y0) % scale]
+    return boxes
+
+def crop_shape(box, scale):
+    x0, y0, x1, y1 = box
+    return (y1 - y0) // scale, (x1 - x0) // scale, 3
+
+def grid_row(board):
+    bits = board_to_bits(board)
+    return bits & LOW_BITS, bits >> 64
+
+def grid_board(row):
+    return bits_to_board(int(row[0]) | int(row[1]) << 64)
+
+def load_index(directory):
+    path = os.path.join(directory, INDEX_NAME)
+    if not os.path.exists(path):
+        return {"version": RECORDING_VERSION, "next_chunk": 0, "chunks": []}
+    with open(path) as f:
+        index = json.load(f)
+    if index.get("version") != RECORDING_VERSION:
+        raise ValueError(f"{path}: unsupported recording version {index.get('version')}")
+    return index
+
+def save_index(directory, index):
+    path = os.path.join(directory, INDEX_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+class _Chunk:
+    """One chunk being written: preallocated memmaps and the open JSONL file."""
+    def __init__(self, path, entry, capacity, scale):
+        self.path = path
+        self.entry = entry
+        self.capacity = capacity
+        self.scale = scale
+        self.loops = 0
+        os.makedirs(path)
+        self.arrays = {part: np.lib.format.open_memmap(os.path.join(path, f"{part}.npy"), mode="w+", dtype=np.uint8,
+                                                       shape=(capacity,) + crop_shape(entry["boxes"][part], scale))
+                       for part in ("board", "tray")}
+        self.arrays["grid"] = np.lib.format.open_memmap(os.path.join(path, "grid.npy"), mode="w+", dtype=np.uint64,
+                                                        shape=(capacity, 2))
+        self.meta = open(os.path.join(path, "loops.jsonl"), "w")
+
+    @property
+    def full(self):
+        return self.loops >= self.capacity
+
+    def add(self, frame, board, record):
+        for part in ("board", "tray"):
+            x0, y0, x1, y1 = self.entry["boxes"][part]
+            row = self.arrays[part][self.loops]
+            if self.scale == 1:
+                row[:] = frame[y0:y1, x0:x1]
+            else:
+                # Nearest neighbour on a whole-multiple box keeps every scale-th pixel, like
+                # frame[y0:y1:s, x0:x1:s], several times faster than numpy's strided copy
+                cv2.resize(frame[y0:y1, x0:x1], (row.shape[1], row.shape[0]), dst=row, interpolation=cv2.INTER_NEAREST)
+        self.arrays["grid"][self.loops] = grid_row(board)
+        self.meta.write(json.dumps(record) + "\n")
+        self.meta.flush()
+        self.loops += 1
+
+    def close(self):
+        """
+        Cut the arrays down to the loops written when the chunk is not full. Full chunks are left
+        to the page cache: an msync here would stall the play loop on the whole chunk.
+        """
+        self.meta.close()
+        arrays, self.arrays = self.arrays, {}
+        for part, array in arrays.items():
+            if self.loops < self.capacity:
+                path = os.path.join(self.path, f"{part}.npy")
+                np.save(path + ".tmp.npy", np.array(array[:self.loops]))
+                os.replace(path + ".tmp.npy", path)
+        self.entry["loops"] = self.loops
+        self.entry["bytes"] = chunk_bytes(self.path)
+
+
+def chunk_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class SessionRecorder:
+    """
+    Writes one loop per add() call. Crops cover the board and tray ROIs plus the margin the
+    tray preprocessing reads, keeping every scale-th pixel. A chunk is closed once it holds
+    chunk_size loops or the geometry changes; the oldest chunks go once the recording
+    exceeds max_bytes, counting the open chunk at full size.
+    """
+    def __init__(self, directory, chunk_size=50, max_bytes=1024 ** 3, scale=1):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.scale = int(scale)
+        os.makedirs(directory, exist_ok=True)
+        self.index = load_index(directory)
+        self.chunk = None
+        self.loops = 0
+
+    def add(self, frame, board, shapes, moves=(), timings=None, **values):
+        """
+        Record one loop: frame is the screenshot detection ran on, moves the plan as
+        (shape, shape_loc, pos), timings {stage: [seconds, ...]}.
+        """
+        boxes = chunk_boxes(get_context(), self.scale)
+        # A calibrated config swapped in mid-session changes the crops, so it starts a new chunk
+        if (self.chunk is None or self.chunk.full or self.chunk.entry["boxes"] != boxes
+                or self.chunk.entry["frame_size"] != [frame.shape[1], frame.shape[0]]):
+            self.open_chunk(frame, boxes)
+        record = {
+            "loop": self.loops,
+            "ts": round(time.time(), 3),
+            "shapes": [[shape, int(shape_loc)] for shape, shape_loc in shapes],
+            "moves": [[int(shape_loc), [int(pos[0]), int(pos[1])]] for _, shape_loc, pos in moves],
+            "timings_ms": {name: [round(s * 1000, 3) for s in durations] for name, durations in (timings or {}).items()},
+        }
+        if values:
+            record["values"] = values
+        self.chunk.add(frame, board, record)
+        self.loops += 1
+
+    def open_chunk(self, frame, boxes):
+        self.close_chunk()
+        height, width = frame.shape[:2]
+        name = f"{self.index['next_chunk']:06d}"
+        self.index["next_chunk"] += 1
+        entry = {
+            "name": name,
+            "config": get_context().__name__,
+            "started": round(time.time(), 3),
+            "scale": self.scale,
+            "frame_size": [width, height],
+            "boxes": boxes,
+            "capacity": self.chunk_size,
+            "loops": 0,
+            "bytes": 0,
+        }
+        self.chunk = _Chunk(os.path.join(self.directory, name), entry, self.chunk_size, self.scale)
+        entry["bytes"] = sum(array.nbytes for array in self.chunk.arrays.values())
+        self.index["chunks"].append(entry)
+        self.rotate()
+        save_index(self.directory, self.index)
+        logger.debug("Recording chunk %s in %s", name, self.directory)
+
+    def close_chunk(self):
+        if self.chunk is not None:
+            self.chunk.close()
+            self.chunk = None
+            save_index(self.directory, self.index)
+
+    def rotate(self):
+        """Delete the oldest chunks until the recording fits max_bytes; the open chunk stays."""
+        chunks = self.index["chunks"]
+        total = sum(entry["bytes"] for entry in chunks)
+        while total > self.max_bytes and len(chunks) > 1:
+            entry = chunks.pop(0)
+            total -= entry["bytes"]
+            shutil.rmtree(os.path.join(self.directory, entry["name"]), ignore_errors=True)
+            logger.info("Recording over %d bytes, dropped chunk %s", self.max_bytes, entry["name"])
+
+    def close(self):
+        self.close_chunk()
+
+
+def make_recorder(cfg):
+    """The SessionRecorder cfg asks for, or None when recording is off."""
+    if not cfg.record_dir:
+        return None
+    return SessionRecorder(cfg.record_dir, cfg.record_chunk_size, cfg.record_max_bytes, cfg.record_scale)
+
+
+# --- Reading ---
+def chunk_loops(directory, entry):
+    """Loops of a chunk, counting the JSONL lines of one left open by a crashed session."""
+    path = os.path.join(directory, entry["name"], "loops.jsonl")
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.endswith("\n")]
+    return records[:entry["capacity"]]
+
+def rebuild_frame(entry, board_crop, tray_crop):
+    """
+    A screenshot-sized frame with the crops pasted back where they came from (upsampled when
+    recorded at a reduced scale) and black everywhere else, for the detectors to read.
+    """
+    width, height = entry["frame_size"]
+    scale = entry["scale"]
+    frame = np.zeros((height, width, 3), np.uint8)
+    for part, crop in (("board", board_crop), ("tray", tray_crop)):
+        x0, y0, x1, y1 = entry["boxes"][part]
+        if scale > 1:
+            crop = np.repeat(np.repeat(crop, scale, axis=0), scale, axis=1)
+        frame[y0:y1, x0:x1] = crop[:y1 - y0, :x1 - x0]
+    return frame
+
+def iter_recording(directory, limit=None, frames=True):
+    """
+    Yield (entry, record, frame, board) per recorded loop, oldest first. record is the loop's
+    JSONL entry; frame comes from rebuild_frame (None unless frames), board from the grid mask.
+    """
+    index = load_index(directory)
+    served = 0
+    for entry in index["chunks"]:
+        path = os.path.join(directory, entry["name"])
+        if not os.path.isdir(path):
+            continue
+        records = chunk_loops(directory, entry)
+        arrays = {part: np.load(os.path.join(path, f"{part}.npy"), mmap_mode="r") for part in ARRAYS}
+        for i, record in enumerate(records):
+            if limit is not None and served >= limit:
+                return
+            frame = rebuild_frame(entry, arrays["board"][i], arrays["tray"][i]) if frames else None
+            yield entry, record, frame, grid_board(arrays["grid"][i])
+            served += 1
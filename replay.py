@@ -0,0 +1,148 @@
+"""
+Run the vision and solver stages over a session recording (recorder.py), no phone needed.
+
+    python replay.py cache/recordings                      # re-detect every loop, report mismatches
+    python replay.py cache/recordings --set tray_reader=template --dump-mismatches cache/mismatches
+    python replay.py cache/recordings --strategies greedy greedy:engine=heuristic lookahead:time_budget=0.05
+
+Vision runs on frames rebuilt from the recorded crops; a recording made with record_scale n
+reads the same pixels live detection did only with vision_scale n.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import cv2
+from board_detection import get_current_board
+from config import find_target, parse_setting
+from block_detection import get_block_shapes
+from context import DeviceSession
+from placement import clear_full_lines, count_full_lines, place_shape_on_board
+from recorder import iter_recording
+from shape_registry import flush_registry, load_registry
+from tournament import STRATEGIES, parse_strategy
+
+
+def play_moves(board, shapes, moves):
+    """(moves that fit, lines cleared) of playing moves as (shape_idx, shape_loc, pos) on board."""
+    placed = lines = 0
+    for shape_idx, _, (row, col) in moves:
+        shape = shapes[shape_idx][0]
+        board = place_shape_on_board(board, shape, row, col)
+        lines += count_full_lines(board)
+        board = clear_full_lines(board)
+        placed += 1
+    return placed, lines
+
+def summarize_ms(samples):
+    if not samples:
+        return {"p50_ms": 0.0, "p95_ms": 0.0}
+    samples = sorted(samples)
+    return {"p50_ms": round(statistics.median(samples), 3),
+            "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3)}
+
+
+# --- Stages ---
+def replay_vision(loops, dump_dir=None):
+    """Re-detect every loop and compare with what was recorded; returns a summary dict."""
+    board_ms, tray_ms, mismatches = [], [], []
+    for entry, record, frame, board in loops:
+        if not board_ms:
+            # The first call builds the templates; keep that out of the timings
+            get_current_board(frame)
+            get_block_shapes(frame)
+        start = time.perf_counter()
+        detected, _ = get_current_board(frame)
+        board_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        shapes = [[shape, int(shape_loc)] for shape, shape_loc in get_block_shapes(frame)]
+        tray_ms.append((time.perf_counter() - start) * 1000)
+
+        parts = [part for part, same in (("board", detected == board), ("tray", shapes == record["shapes"])) if not same]
+        if parts:
+            name = f"{entry['name']}_{record['loop']}"
+            mismatches.append({"loop": name, "parts": parts})
+            if dump_dir:
+                os.makedirs(dump_dir, exist_ok=True)
+                cv2.imwrite(os.path.join(dump_dir, f"{name}.png"), frame)
+    return {"loops": len(board_ms), "board": summarize_ms(board_ms), "tray": summarize_ms(tray_ms),
+            "mismatches": mismatches}
+
+def replay_strategies(loops, specs):
+    """Plan every recorded (board, tray) with each strategy; placements, lines and solve time."""
+    strategies = {}
+    for spec in specs:
+        name, params = parse_strategy(spec)
+        strategies[spec] = STRATEGIES[name](**params)
+    rows = {spec: {"strategy": spec, "loops": 0, "moves": 0, "lines": 0, "same_as_recorded": 0, "ms": []}
+            for spec in specs}
+    for _, record, _, board in loops:
+        shapes = [(shape, shape_loc) for shape, shape_loc in record["shapes"]]
+        for spec, strategy in strategies.items():
+            start = time.perf_counter()
+            moves = strategy([row[:] for row in board], shapes)
+            row = rows[spec]
+            row["ms"].append((time.perf_counter() - start) * 1000)
+            placed, lines = play_moves(board, shapes, moves)
+            row["loops"] += 1
+            row["moves"] += placed
+            row["lines"] += lines
+            if [[shape_loc, list(pos)] for _, shape_loc, pos in moves] == record["moves"]:
+                row["same_as_recorded"] += 1
+    for row in rows.values():
+        row.update(summarize_ms(row.pop("ms")))
+    return list(rows.values())
+
+
+def print_vision(summary):
+    print(f"vision: {summary['loops']} loops, board p50 {summary['board']['p50_ms']:.2f}ms "
+          f"p95 {summary['board']['p95_ms']:.2f}ms, tray p50 {summary['tray']['p50_ms']:.2f}ms "
+          f"p95 {summary['tray']['p95_ms']:.2f}ms, {len(summary['mismatches'])} mismatches")
+    for mismatch in summary["mismatches"]:
+        print(f"  {mismatch['loop']}: {', '.join(mismatch['parts'])}")
+
+def print_strategies(rows):
+    print(f"{'strategy':<36}{'loops':>7}{'moves':>7}{'lines':>7}{'same':>7}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in rows:
+        print(f"{row['strategy']:<36}{row['loops']:>7}{row['moves']:>7}{row['lines']:>7}{row['same_as_recorded']:>7}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("recording", help="record_dir of the session to replay")
+    parser.add_argument("--target", type=find_target, default=13, help="config id or name to detect with")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="config override for the replay, e.g. tray_reader=template (repeatable)")
+    parser.add_argument("--strategies", nargs="*", default=[],
+                        help=f"also plan each recorded tray with name[:key=value,...], name in {', '.join(STRATEGIES)}")
+    parser.add_argument("--no-vision", action="store_true", help="skip re-detection")
+    parser.add_argument("--limit", type=int, default=None, help="replay at most this many loops")
+    parser.add_argument("--dump-mismatches", metavar="DIR", help="write rebuilt frames of mismatching loops here")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    for spec in args.strategies:
+        parse_strategy(spec)  # fail before replaying anything
+    session = DeviceSession(args.target, name="replay", **dict(parse_setting(item) for item in args.set)).bind()
+    load_registry(session.config.shape_registry_path)
+
+    results = {"recording": args.recording}
+    if not args.no_vision:
+        results["vision"] = replay_vision(iter_recording(args.recording, args.limit), args.dump_mismatches)
+        print_vision(results["vision"])
+    if args.strategies:
+        results["strategies"] = replay_strategies(iter_recording(args.recording, args.limit, frames=False),
+                                                  args.strategies)
+        print_strategies(results["strategies"])
+        flush_registry()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+    return 1 if results.get("vision", {}).get("mismatches") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import logging
+import os
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+IN_GAME = "in_game"
+AD_POPUP = "ad_popup"
+LEVEL_UP = "level_up"
+DIAMOND_OFFER = "diamond_offer"
+GAME_OVER = "game_over"
+DAILY_REWARD = "daily_reward"
+UNKNOWN = "unknown"
+
+SCREEN_STATES = (IN_GAME, AD_POPUP, LEVEL_UP, DIAMOND_OFFER, GAME_OVER, DAILY_REWARD)
+
+# Config button attributes tapped for each screen, in order.
+STATE_TAPS = {
+    IN_GAME: (),
+    AD_POPUP: ("pop_up_high_close", "pop_up_low_close"),
+    LEVEL_UP: ("level_up_next_button",),
+    DIAMOND_OFFER: ("diamond_no_thanks_button", "diamond_next_button"),
+    GAME_OVER: ("more_score_wheel_no_thanks_button", "start_game_button"),
+    DAILY_REWARD: ("no_thanks_daily",),
+}
+
+# Every button, in the order the blind popup sweep taps them.
+ALL_POPUP_TAPS = (
+    "pop_up_high_close", "pop_up_low_close",
+    "start_game_button", "more_score_wheel_no_thanks_button", "diamond_no_thanks_button",
+    "diamond_next_button", "no_thanks_daily", "level_up_next_button",
+)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+# --- Screen fingerprint ---
+def screen_hash(frame, hash_size=16, step=16):
+    """
+    Coarse luminance fingerprint of a whole BGR frame: a hash_size x 2*hash_size gray
+    thumbnail of every step-th pixel. Not a perceptual hash: it is compared by mean absolute
+    difference, so a dimmed overlay moves it about as much as a new layout does.
+    """
+    small = frame[::step, ::step]
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    thumb = cv2.resize(small, (hash_size, hash_size * 2), interpolation=cv2.INTER_AREA)
+    return thumb.astype(np.int16).ravel()
+
+
+class ScreenStateIndex:
+    """Nearest-neighbour index of reference screen hashes, labelled with their screen state."""
+    def __init__(self, hash_size=16, max_distance=30.0):
+        self.hash_size = hash_size
+        self.max_distance = max_distance
+        self.states = []
+        self.hashes = np.empty((0, hash_size * hash_size * 2), dtype=np.int16)
+
+    def __len__(self):
+        return len(self.states)
+
+    def add(self, state, frame):
+        self.states.append(state)
+        self.hashes = np.vstack([self.hashes, screen_hash(frame, self.hash_size)])
+
+    def add_directory(self, directory):
+        """Index every image under directory/<state>/, one sub-directory per screen state."""
+        if not directory or not os.path.isdir(directory):
+            return 0
+        added = 0
+        for state in SCREEN_STATES:
+            state_dir = os.path.join(directory, state)
+            if not os.path.isdir(state_dir):
+                continue
+            for name in sorted(os.listdir(state_dir)):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                frame = cv2.imread(os.path.join(state_dir, name))
+                if frame is None:
+                    logger.warning("Could not read reference %s", name)
+                    continue
+                self.add(state, frame)
+                added += 1
+        return added
+
+    def classify(self, frame):
+        """Returns (state, distance); UNKNOWN when no reference is within max_distance."""
+        if not self.states:
+            return UNKNOWN, float("inf")
+        distances = np.abs(self.hashes - screen_hash(frame, self.hash_size)).mean(axis=1)
+        best = int(distances.argmin())
+        distance = float(distances[best])
+        if distance > self.max_distance:
+            return UNKNOWN, distance
+        return self.states[best], distance
+
+
+def build_screen_index(cfg):
+    """
+    Index from cfg.screen_reference_dir, seeded with the board template as an in-game screen.
+    The repo ships no reference captures, so out of the box the index only holds that
+    template: every frame is IN_GAME or UNKNOWN, and popups are cleared by the blind sweep.
+    """
+    index = ScreenStateIndex(cfg.screen_hash_size, cfg.screen_max_distance)
+    board_template = cv2.imread(cfg.board_template_path)
+    if board_template is not None:
+        index.add(IN_GAME, board_template)
+    added = index.add_directory(cfg.screen_reference_dir)
+    logger.info("Indexed %d reference screens (%d from %s)", len(index), added, cfg.screen_reference_dir)
+    if not any(state != IN_GAME for state in index.states):
+        logger.warning("No popup captures in %s: popups are only cleared by the blind sweep",
+                       cfg.screen_reference_dir)
+    return index
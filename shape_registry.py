@@ -0,0 +1,156 @@
+import json
+import logging
+import os
+import threading
+from bitboard import BOARD_ROWS, BOARD_COLS, ROW_MASKS, COL_MASKS, shape_to_bits
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_VERSION = 1
+
+# Shape key -> tuple of (row, col, occupancy_mask, touched_line_masks) for every anchor
+# that keeps the shape on the board.
+REGISTRY = {}
+REGISTRY_STATE = {
+    "path": None,
+    "dirty": False,
+}
+# Device sessions on other threads may add shapes and save at the same time.
+REGISTRY_LOCK = threading.Lock()
+
+
+# --- Canonical shape keys ---
+def shape_key(shape):
+    """Canonical hash of a shape matrix, e.g. '2x3:111010'."""
+    return f"{len(shape)}x{len(shape[0])}:" + "".join("1" if cell == 1 else "0" for row in shape for cell in row)
+
+def shape_from_key(key):
+    dims, cells = key.split(":")
+    rows, cols = (int(v) for v in dims.split("x"))
+    return [[int(cells[r * cols + c]) for c in range(cols)] for r in range(rows)]
+
+
+# --- Block Blast piece library ---
+def _rotate(shape):
+    return [list(row) for row in zip(*shape[::-1])]
+
+def _orientations(shape, mirror=False):
+    variants = []
+    candidates = [shape, [row[::-1] for row in shape]] if mirror else [shape]
+    for variant in candidates:
+        for _ in range(4):
+            if variant not in variants:
+                variants.append(variant)
+            variant = _rotate(variant)
+    return variants
+
+BASE_PIECES = [
+    ([[1]], False),
+    ([[1, 1]], False),
+    ([[1, 1, 1]], False),
+    ([[1, 1, 1, 1]], False),
+    ([[1, 1, 1, 1, 1]], False),
+    ([[1, 1], [1, 1]], False),
+    ([[1, 1, 1], [1, 1, 1]], False),
+    ([[1, 1, 1], [1, 1, 1], [1, 1, 1]], False),
+    ([[1, 0], [1, 1]], False),
+    ([[1, 0], [1, 0], [1, 1]], True),
+    ([[1, 0, 0], [1, 0, 0], [1, 1, 1]], False),
+    ([[1, 1, 1], [0, 1, 0]], False),
+    ([[1, 1, 0], [0, 1, 1]], True),
+    # Pentomino and larger pieces seen in the sea block tray
+    ([[1, 1], [1, 0], [1, 1]], False),
+    ([[1, 0, 0], [1, 1, 1], [1, 0, 0]], False),
+    ([[1, 1, 0], [0, 1, 0], [0, 1, 1]], True),
+    ([[1, 0], [1, 1], [0, 1], [0, 1]], True),
+    ([[0, 1, 0], [0, 1, 0], [1, 1, 1], [0, 1, 0]], True),
+]
+
+PIECE_LIBRARY = [variant for base, mirror in BASE_PIECES for variant in _orientations(base, mirror)]
+# Orientation keys of each base piece, in BASE_PIECES order.
+PIECE_FAMILIES = [tuple(shape_key(variant) for variant in _orientations(base, mirror)) for base, mirror in BASE_PIECES]
+PIECE_KEYS = frozenset(shape_key(shape) for shape in PIECE_LIBRARY)
+
+def is_known_piece(shape):
+    return shape_key(shape) in PIECE_KEYS
+
+
+# --- Placement table ---
+def build_placements(shape):
+    """Every legal anchor of a shape on an empty board with the lines it touches."""
+    shape_rows, shape_cols = len(shape), len(shape[0])
+    used_rows = [i for i in range(shape_rows) if any(cell == 1 for cell in shape[i])]
+    used_cols = [j for j in range(shape_cols) if any(shape[i][j] == 1 for i in range(shape_rows))]
+    placements = []
+    for row in range(BOARD_ROWS - shape_rows + 1):
+        for col in range(BOARD_COLS - shape_cols + 1):
+            lines = tuple(ROW_MASKS[row + i] for i in used_rows) + tuple(COL_MASKS[col + j] for j in used_cols)
+            placements.append((row, col, shape_to_bits(shape, row, col), lines))
+    return tuple(placements)
+
+def get_placements(shape):
+    """
+    Cached placement table for a shape; unknown shapes are added on first use. This runs
+    inside the solve, so a new shape only marks the registry dirty for flush_registry.
+    """
+    key = shape_key(shape)
+    placements = REGISTRY.get(key)
+    if placements is None:
+        placements = REGISTRY[key] = build_placements(shape)
+        REGISTRY_STATE["dirty"] = True
+    return placements
+
+def legal_placements(bits, shape):
+    return [p for p in get_placements(shape) if not bits & p[2]]
+
+
+# --- Persistence ---
+def load_registry(path):
+    """Load a saved registry (if any), seed it with the piece library and remember the path."""
+    REGISTRY_STATE["path"] = path
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == REGISTRY_VERSION:
+                for key, placements in data["shapes"].items():
+                    REGISTRY[key] = tuple((r, c, mask, tuple(lines)) for r, c, mask, lines in placements)
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable registry %s: %s", path, e)
+    for shape in PIECE_LIBRARY:
+        key = shape_key(shape)
+        if key not in REGISTRY:
+            REGISTRY[key] = build_placements(shape)
+            REGISTRY_STATE["dirty"] = True
+    if REGISTRY_STATE["dirty"]:
+        save_registry()
+    return REGISTRY
+
+def save_registry(path=None):
+    path = path or REGISTRY_STATE["path"]
+    if path is None:
+        return
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with REGISTRY_LOCK:
+        # Cleared before the snapshot, so a shape added while writing is saved next time
+        REGISTRY_STATE["dirty"] = False
+        data = {
+            "version": REGISTRY_VERSION,
+            "shapes": {key: [[r, c, mask, list(lines)] for r, c, mask, lines in placements]
+                       for key, placements in list(REGISTRY.items())},
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+def flush_registry():
+    """Save the registry if shapes were added since the last save; call it outside the solve."""
+    if REGISTRY_STATE["dirty"] and REGISTRY_STATE["path"]:
+        try:
+            save_registry()
+        except OSError as e:
+            REGISTRY_STATE["dirty"] = True
+            logger.warning("Could not save registry %s: %s", REGISTRY_STATE["path"], e)
@@ -0,0 +1,227 @@
+import random
+import time
+from bitboard import bits_to_board, board_to_bits, count_cells
+from shape_registry import PIECE_FAMILIES, get_placements, shape_from_key
+
+TRAY_SIZE = 3
+# Tray coordinate reported as shape_loc for each slot; get_tap_pos maps 0-5, 6-11, 12+ to slots.
+SLOT_LOCS = (0, 6, 12)
+
+# Shape key -> (placement table, cell count), shared by every game in the process.
+PIECE_TABLES = {}
+
+
+# --- Piece weights ---
+def default_piece_weights():
+    """Every base piece equally likely, its weight split over its orientations."""
+    weights = {}
+    for family in PIECE_FAMILIES:
+        for key in family:
+            weights[key] = weights.get(key, 0) + 1.0 / len(family)
+    return weights
+
+
+def piece_table(key):
+    entry = PIECE_TABLES.get(key)
+    if entry is None:
+        table = get_placements(shape_from_key(key))
+        entry = PIECE_TABLES[key] = (table, count_cells(table[0][2]))
+    return entry
+
+
+_DEFAULT_DECK = []
+
+def default_deck():
+    if not _DEFAULT_DECK:
+        _DEFAULT_DECK.append(Deck())
+    return _DEFAULT_DECK[0]
+
+
+# --- Scoring ---
+def line_points(lines, combo):
+    """10 for one line, 30 for two, 60 for three...; multiplied by the current clear streak."""
+    return 10 * lines * (lines + 1) // 2 * (combo + 1)
+
+
+class Deck:
+    """Weighted piece set a game deals from; build once and share between games."""
+    def __init__(self, weights=None):
+        weights = weights or default_piece_weights()
+        self.keys = [key for key, weight in weights.items() if weight > 0]
+        self.cum_weights = []
+        total = 0.0
+        for key in self.keys:
+            total += weights[key]
+            self.cum_weights.append(total)
+        self.tables = {key: piece_table(key)[0] for key in self.keys}
+        self.cells = {key: piece_table(key)[1] for key in self.keys}
+
+
+class Game:
+    """
+    Headless Block Blast: 10x10 bitboard, trays of three weighted pieces, rows and columns
+    emptied in place when full, game over once no tray piece fits.
+    """
+    def __init__(self, seed=None, deck=None):
+        self.rng = random.Random(seed)
+        self.deck = deck or default_deck()
+        self.tables = self.deck.tables
+        self.cells = self.deck.cells
+        self.bits = 0
+        self.tray = []  # [(slot, shape key)] still to place this round
+        self.score = 0
+        self.moves = 0
+        self.lines = 0
+        self.combo = 0  # consecutive moves that cleared at least one line
+        self.trays = 0
+        self.over = False
+        self.deal()
+
+    def deal(self):
+        keys = self.rng.choices(self.deck.keys, cum_weights=self.deck.cum_weights, k=TRAY_SIZE)
+        self.tray = list(enumerate(keys))
+        self.trays += 1
+        self.check_over()
+
+    def check_over(self):
+        bits = self.bits
+        for _, key in self.tray:
+            for placement in self.tables[key]:
+                if not bits & placement[2]:
+                    self.over = False
+                    return False
+        self.over = True
+        return True
+
+    # --- Views in the shape auto_play works with ---
+    def board(self):
+        return bits_to_board(self.bits)
+
+    def shapes(self):
+        """Tray as detected by get_block_shapes: [(shape matrix, shape_loc)]."""
+        return [(shape_from_key(key), SLOT_LOCS[slot]) for slot, key in self.tray]
+
+    def legal_placements(self, tray_idx):
+        bits = self.bits
+        return [p for p in self.tables[self.tray[tray_idx][1]] if not bits & p[2]]
+
+    # --- Moves ---
+    def place(self, tray_idx, row, col):
+        """Place a tray piece at (row, col). Returns lines cleared, or None if it doesn't fit."""
+        key = self.tray[tray_idx][1]
+        table = self.tables[key]
+        placement = next((p for p in table if p[0] == row and p[1] == col), None)
+        if placement is None or self.bits & placement[2]:
+            return None
+        return self.apply(tray_idx, placement)
+
+    def apply(self, tray_idx, placement):
+        """Place using an entry from the piece's placement table (assumed legal)."""
+        _, key = self.tray.pop(tray_idx)
+        placed = self.bits | placement[2]
+        lines, cleared = 0, 0
+        # Lines can only complete where the piece landed.
+        for line in placement[3]:
+            if placed & line == line:
+                lines += 1
+                cleared |= line
+        self.bits = placed & ~cleared
+        self.combo = self.combo + 1 if lines else 0
+        self.score += self.cells[key] + (line_points(lines, self.combo - 1) if lines else 0)
+        self.lines += lines
+        self.moves += 1
+        if not self.tray:
+            self.deal()
+        else:
+            self.check_over()
+        return lines
+
+    def play_turn(self, strategy):
+        """
+        Ask strategy(board, shapes) for moves as (shape_idx, shape_loc, pos), the format of
+        solver.solve_tray and placement.plan_greedy, and play them. Returns moves played.
+        """
+        if self.over:
+            return 0
+        shapes = self.shapes()
+        slots = [slot for slot, _ in self.tray]
+        played = 0
+        for shape_idx, _, (row, col) in strategy(self.board(), shapes):
+            slot = slots[shape_idx]
+            tray_idx = next((i for i, (s, _) in enumerate(self.tray) if s == slot), None)
+            if tray_idx is None or self.place(tray_idx, row, col) is None:
+                break  # the plan no longer matches the game
+            played += 1
+            if self.over or len(self.tray) == TRAY_SIZE:
+                break  # game ended or a new tray was dealt mid-plan
+        if not played and not self.over:
+            self.over = True  # strategy gave up while a move was available
+        return played
+
+    def play(self, strategy, max_moves=None):
+        while not self.over and (max_moves is None or self.moves < max_moves):
+            self.play_turn(strategy)
+        return self.result()
+
+    def result(self):
+        return {"score": self.score, "moves": self.moves, "lines": self.lines, "trays": self.trays}
+
+
+# --- Strategies: fn(board, shapes) -> [(shape_idx, shape_loc, pos)] ---
+def random_strategy(seed=None):
+    """Uniformly random legal placement of each piece in tray order; a speed baseline."""
+    rng = random.Random(seed)
+
+    def strategy(board, shapes):
+        bits = board_to_bits(board)
+        moves = []
+        for idx, (shape, shape_loc) in enumerate(shapes):
+            legal = [p for p in get_placements(shape) if not bits & p[2]]
+            if not legal:
+                continue
+            row, col, shape_bits, lines = rng.choice(legal)
+            placed = bits | shape_bits
+            bits = placed & ~sum(line for line in lines if placed & line == line)
+            moves.append((idx, shape_loc, (row, col)))
+        return moves
+    return strategy
+
+
+def random_playout(game, rng):
+    """
+    Fastest self-play loop, straight on the bitboard: a random tray piece goes to the first
+    legal anchor after a random start in its placement table.
+    """
+    tables = game.tables
+    while not game.over:
+        bits = game.bits
+        start_idx = rng.randrange(len(game.tray))
+        for offset in range(len(game.tray)):
+            tray_idx = (start_idx + offset) % len(game.tray)
+            table = tables[game.tray[tray_idx][1]]
+            start = rng.randrange(len(table))
+            placement = next((p for p in table[start:] if not bits & p[2]), None) or \
+                next((p for p in table[:start] if not bits & p[2]), None)
+            if placement is not None:
+                game.apply(tray_idx, placement)
+                break
+    return game.result()
+
+
+if __name__ == "__main__":
+    games = 5000
+    start = time.perf_counter()
+    moves = 0
+    for seed in range(games):
+        moves += random_playout(Game(seed), random.Random(seed))["moves"]
+    elapsed = time.perf_counter() - start
+    print(f"random playout: {games} games, {moves} moves, {moves / elapsed:,.0f} moves/s")
+
+    from placement import plan_greedy
+    start = time.perf_counter()
+    results = [Game(seed).play(lambda board, shapes: plan_greedy(board, shapes, verbose=False), max_moves=300)
+               for seed in range(20)]
+    elapsed = time.perf_counter() - start
+    moves = sum(r["moves"] for r in results)
+    print(f"greedy: {len(results)} games, avg score {sum(r['score'] for r in results) / len(results):.0f}, "
+          f"{moves / elapsed:,.0f} moves/s")
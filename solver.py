@@ -0,0 +1,287 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from bitboard import LINE_MASKS, board_to_bits, clear_full_lines_bits, count_cells
+from shape_registry import REGISTRY_STATE, get_placements, shape_from_key, shape_key
+
+logger = logging.getLogger(__name__)
+
+PLACE_WEIGHT = 1000
+LINE_WEIGHT = 10
+
+NEG_INF = float("-inf")
+
+# Process pool shared by every parallel solve; started once by start_solver_pool.
+SOLVER_POOL = {
+    "executor": None,
+    "workers": 0,
+}
+
+
+# --- Leaf evaluation ---
+def default_leaf_eval(bits):
+    """Prefer emptier boards; never positive, so 0 is a valid upper bound."""
+    return -count_cells(bits)
+
+
+class _Search:
+    def __init__(self, pieces, evaluate, leaf_upper, node_budget, time_budget):
+        self.pieces = pieces  # shape key -> placement table
+        self.evaluate = evaluate
+        self.leaf_upper = leaf_upper
+        self.node_budget = node_budget
+        self.deadline = time.perf_counter() + time_budget if time_budget else None
+        self.table = {}
+        self.nodes = 0
+        self.tt_hits = 0
+        self.cutoffs = 0
+        self.exhausted = False
+        # Most lines a piece can complete: one per row and column it touches.
+        self.max_lines = {key: max((len(p[3]) for p in table), default=0) for key, table in pieces.items()}
+        self.cells = {key: count_cells(table[0][2]) if table else 0 for key, table in pieces.items()}
+
+    def upper_bound(self, bits, remaining):
+        """Optimistic value of placing every remaining piece from this board."""
+        cells = sum(self.cells[key] for key in remaining)
+        # Only lines that the remaining cells could fill can ever clear.
+        reachable = sum(1 for mask in LINE_MASKS if count_cells(mask & ~bits) <= cells)
+        lines = min(reachable, sum(self.max_lines[key] for key in remaining))
+        return PLACE_WEIGHT * len(remaining) + LINE_WEIGHT * lines + self.leaf_upper
+
+    def out_of_budget(self):
+        if self.exhausted:
+            return True
+        if self.node_budget and self.nodes >= self.node_budget:
+            self.exhausted = True
+        elif self.deadline and (self.nodes & 7) == 0 and time.perf_counter() > self.deadline:
+            self.exhausted = True
+        return self.exhausted
+
+    def children(self, bits, remaining):
+        moves = []
+        for idx, key in enumerate(remaining):
+            if idx and remaining[idx - 1] == key:
+                continue  # identical pieces give identical subtrees
+            rest = remaining[:idx] + remaining[idx + 1:]
+            for row, col, shape_bits, lines in self.pieces[key]:
+                if bits & shape_bits:
+                    continue
+                placed = bits | shape_bits
+                lines_cleared, cleared = 0, 0
+                # The board never holds a full line between moves, so only touched lines can clear.
+                for line in lines:
+                    if placed & line == line:
+                        lines_cleared += 1
+                        cleared |= line
+                gain = PLACE_WEIGHT + LINE_WEIGHT * lines_cleared
+                moves.append((gain, placed & ~cleared, rest, (key, row, col)))
+        # Move ordering: biggest immediate clears first tightens the cutoff early.
+        moves.sort(key=lambda m: m[0], reverse=True)
+        return moves
+
+    def greedy_tail(self, bits, remaining):
+        """Cheap completion for a branch reached with no sequence yet: best immediate move each step."""
+        value, seq = 0, []
+        while remaining:
+            moves = self.children(bits, remaining)
+            if not moves:
+                break
+            gain, bits, remaining, move = moves[0]
+            value += gain
+            seq.append(move)
+        return value + self.evaluate(bits), seq
+
+    def search(self, bits, remaining, alpha):
+        """Returns (value, sequence, exact). Inexact values are upper bounds <= alpha."""
+        if not remaining:
+            return self.evaluate(bits), [], True
+
+        tt_key = (bits, remaining)
+        entry = self.table.get(tt_key)
+        if entry is not None:
+            value, seq, exact = entry
+            if exact or value <= alpha:
+                self.tt_hits += 1
+                return entry
+
+        upper = self.upper_bound(bits, remaining)
+        if upper <= alpha:
+            self.cutoffs += 1
+            return upper, None, False
+
+        if self.out_of_budget():
+            value, seq = self.greedy_tail(bits, remaining)
+            return value, seq, True
+
+        self.nodes += 1
+        moves = self.children(bits, remaining)
+        if not moves:
+            result = (self.evaluate(bits), [], True)
+            self.table[tt_key] = result
+            return result
+
+        best, best_seq = NEG_INF, None
+        failed_upper = NEG_INF
+        for gain, child_bits, rest, move in moves:
+            bound = gain + self.upper_bound(child_bits, rest) if rest else gain + self.evaluate(child_bits)
+            if bound <= max(alpha, best):
+                self.cutoffs += 1
+                if bound > best:
+                    failed_upper = max(failed_upper, bound)
+                continue
+            value, seq, exact = self.search(child_bits, rest, max(alpha, best) - gain)
+            total = gain + value
+            if not exact:
+                failed_upper = max(failed_upper, total)
+            elif total > best:
+                best, best_seq = total, [move] + seq
+            if self.exhausted and best_seq is not None:
+                break  # out of budget: keep the best sequence rather than complete every sibling
+
+        if failed_upper > best and not (self.exhausted and best_seq is not None):
+            result = (max(best, failed_upper), None, False)
+        else:
+            result = (best, best_seq, True)
+        if not self.exhausted:
+            self.table[tt_key] = result
+        return result
+
+
+# --- Full tray lookahead ---
+def _prepare(board, shapes):
+    # The game clears full lines instantly, so a detected board never legitimately holds one.
+    bits = clear_full_lines_bits(board_to_bits(board))
+    keys = [shape_key(shape) for shape, _ in shapes]
+    pieces = {key: get_placements(shape) for key, (shape, _) in zip(keys, shapes)}
+    return bits, keys, pieces
+
+def _to_moves(seq, keys, shapes):
+    moves = []
+    used = set()
+    for key, row, col in seq or []:
+        idx = next(i for i, k in enumerate(keys) if k == key and i not in used)
+        used.add(idx)
+        moves.append((idx, shapes[idx][1], (row, col)))
+    return moves
+
+def _report(label, moves, shapes, score, nodes, tt_hits, cutoffs, exhausted, start):
+    elapsed = (time.perf_counter() - start) * 1000
+    budget_note = " (budget hit)" if exhausted else ""
+    logger.debug("🔎 %s: %d/%d shapes, score %s, %d nodes, %d tt hits, %d cutoffs in %.1fms%s",
+                 label, len(moves), len(shapes), score, nodes, tt_hits, cutoffs, elapsed, budget_note)
+
+def solve_tray(board, shapes, node_budget=200000, time_budget=0.5, evaluate=default_leaf_eval,
+               leaf_upper=0, verbose=True):
+    """
+    Search every ordering and placement of the tray pieces.
+    Returns (moves, score) where moves is a list of (shape_idx, shape_loc, pos) in play order.
+    """
+    if not shapes:
+        return [], 0
+    start = time.perf_counter()
+    bits, keys, pieces = _prepare(board, shapes)
+    search = _Search(pieces, evaluate, leaf_upper, node_budget, time_budget)
+    score, seq, _ = search.search(bits, tuple(sorted(keys)), NEG_INF)
+
+    moves = _to_moves(seq, keys, shapes)
+    if verbose:
+        _report("Lookahead", moves, shapes, score, search.nodes, search.tt_hits, search.cutoffs,
+                search.exhausted, start)
+    return moves, score
+
+
+# --- Parallel lookahead ---
+def start_solver_pool(workers, initializer=None, initargs=()):
+    """
+    Start the shared solver pool once; later calls with the same size are no-ops.
+    initializer(*initargs) runs in every worker, e.g. to apply config that workers started
+    with spawn would not inherit.
+    """
+    if SOLVER_POOL["executor"] is not None:
+        if SOLVER_POOL["workers"] == workers:
+            return SOLVER_POOL["executor"]
+        stop_solver_pool()
+    if workers <= 1:
+        return None
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(initializer, initargs))
+    # Spawn every worker now so the first solve does not pay for process start-up.
+    list(executor.map(_warm_up, range(workers)))
+    SOLVER_POOL["executor"] = executor
+    SOLVER_POOL["workers"] = workers
+    return executor
+
+def stop_solver_pool():
+    executor = SOLVER_POOL["executor"]
+    if executor is not None:
+        executor.shutdown(cancel_futures=True)
+    SOLVER_POOL["executor"] = None
+    SOLVER_POOL["workers"] = 0
+
+def _init_worker(initializer, initargs):
+    # Only the parent saves the registry: forked workers inherit its path, and shapes they
+    # learn would otherwise be written by several processes at once
+    REGISTRY_STATE["path"] = None
+    if initializer is not None:
+        initializer(*initargs)
+
+def _warm_up(_):
+    return True
+
+def _search_branches(branches, keys, node_budget, deadline, evaluate, leaf_upper):
+    """Worker entry point: boards arrive as ints and shapes as registry keys."""
+    pieces = {key: get_placements(shape_from_key(key)) for key in set(keys)}
+    # The deadline is wall-clock so it means the same thing in every process.
+    time_budget = max(deadline - time.time(), 1e-6) if deadline else 0
+    search = _Search(pieces, evaluate, leaf_upper, node_budget, time_budget)
+    best, best_seq = NEG_INF, None
+    for gain, child_bits, rest, move in branches:
+        value, seq, exact = search.search(child_bits, rest, best - gain)
+        if exact and gain + value > best:
+            best, best_seq = gain + value, [move] + seq
+        if search.exhausted and best_seq is not None:
+            break
+    return best, best_seq, search.nodes, search.tt_hits, search.cutoffs, search.exhausted
+
+def solve_tray_parallel(board, shapes, node_budget=200000, time_budget=0.5, evaluate=default_leaf_eval,
+                        leaf_upper=0, verbose=True):
+    """
+    solve_tray with the top-level branches (piece order x first placement) spread over the
+    shared process pool. Falls back to solve_tray when no pool is running.
+    """
+    executor = SOLVER_POOL["executor"]
+    if executor is None or not shapes:
+        return solve_tray(board, shapes, node_budget, time_budget, evaluate, leaf_upper, verbose)
+
+    start = time.perf_counter()
+    bits, keys, pieces = _prepare(board, shapes)
+    root = _Search(pieces, evaluate, leaf_upper, 0, 0)
+    branches = root.children(bits, tuple(sorted(keys)))
+    if not branches:
+        if verbose:
+            _report("Parallel lookahead", [], shapes, evaluate(bits), 0, 0, 0, False, start)
+        return [], evaluate(bits)
+
+    # One chunk per worker, dealt round-robin so each gets a share of the high-gain moves.
+    chunk_count = min(len(branches), SOLVER_POOL["workers"])
+    chunks = [branches[i::chunk_count] for i in range(chunk_count)]
+    chunk_budget = max(1, node_budget // chunk_count) if node_budget else 0
+    deadline = time.time() + time_budget if time_budget else 0
+    futures = [executor.submit(_search_branches, chunk, keys, chunk_budget, deadline, evaluate, leaf_upper)
+               for chunk in chunks]
+
+    score, seq = NEG_INF, None
+    nodes = tt_hits = cutoffs = 0
+    exhausted = False
+    for future in futures:
+        value, chunk_seq, chunk_nodes, chunk_hits, chunk_cutoffs, chunk_exhausted = future.result()
+        nodes += chunk_nodes
+        tt_hits += chunk_hits
+        cutoffs += chunk_cutoffs
+        exhausted = exhausted or chunk_exhausted
+        if chunk_seq is not None and value > score:
+            score, seq = value, chunk_seq
+
+    moves = _to_moves(seq, keys, shapes)
+    if verbose:
+        _report("Parallel lookahead", moves, shapes, score, nodes, tt_hits, cutoffs, exhausted, start)
+    return moves, score
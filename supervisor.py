@@ -0,0 +1,149 @@
+"""
+Drive several phones from one process: a DeviceSession per phone, each playing on its own
+thread, every solve going to one shared solver process pool.
+
+    python supervisor.py --device 13:<udid> --device 13:<udid>
+    python supervisor.py --fake test_data --fake test_data --duration 30
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from auto_ios import APPIUM_SERVER_URL, connect_driver, run_session
+from config import CONFIGS, find_target
+from context import DeviceSession
+from evaluation import configure_evaluation
+from fake_driver import FakeDriver
+from shape_registry import load_registry
+from solver import start_solver_pool, stop_solver_pool
+from telemetry import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# Per-device files, suffixed with the session name unless the session overrides them.
+SESSION_PATHS = ("drop_offset_path", "trace_path", "metrics_path", "current_screen_template_path", "record_dir")
+
+
+def session_path(path, name):
+    """'cache/trace.jsonl' -> 'cache/trace_<name>.jsonl'."""
+    if not path:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+def make_session(target_id, name, driver=None, **overrides):
+    """DeviceSession with its own copies of the per-device files and a device metrics label."""
+    base = CONFIGS.get(target_id)
+    if base is not None:
+        for attr in SESSION_PATHS:
+            overrides.setdefault(attr, session_path(getattr(base, attr, None), name))
+        overrides.setdefault("metrics_labels", {**getattr(base, "metrics_labels", {}), "device": name})
+    session = DeviceSession(target_id, driver, name, **overrides)
+    session.owns_solver_pool = False
+    return session
+
+
+class Supervisor:
+    """
+    Runs every session on a thread of its own and restarts a session's loop after a crash.
+    The solver pool and shape registry are shared, so each extra phone costs a thread, its
+    frames and its template cache instead of a whole interpreter.
+    """
+    def __init__(self, sessions, solver_workers=None, restart_delay=5.0):
+        self.sessions = list(sessions)
+        self.solver_workers = solver_workers or os.cpu_count() or 1
+        self.restart_delay = restart_delay
+        self.threads = []
+
+    def run_session(self, session):
+        while not session.stopped:
+            try:
+                run_session(session)
+            except Exception as e:
+                session.count("errors")
+                logger.exception("%s crashed: %s", session.name, e)
+                session.stop_event.wait(self.restart_delay)
+
+    def start(self):
+        cfg = self.sessions[0].config
+        load_registry(cfg.shape_registry_path)
+        # Evaluation weights are process-wide, so every session plays with the first one's
+        configure_evaluation(cfg.eval_weights)
+        start_solver_pool(self.solver_workers, configure_evaluation, (cfg.eval_weights,))
+        for session in self.sessions:
+            thread = threading.Thread(target=self.run_session, args=(session,), name=session.name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info("Supervising %d sessions on %d solver workers", len(self.sessions), self.solver_workers)
+
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def stop(self):
+        for session in self.sessions:
+            session.stop()
+        self.join(timeout=30)
+        stop_solver_pool()
+        for session in self.sessions:
+            logger.info("%s: %s", session.name, session.stats)
+
+    def run(self, duration=None):
+        """Play until every session stops, duration seconds pass or Ctrl-C."""
+        self.start()
+        try:
+            self.join(duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stats(self):
+        return {session.name: dict(session.stats) for session in self.sessions}
+
+
+def parse_device(spec):
+    """'13:<udid>' or 'iphone13:<udid>' -> (13, '<udid>')."""
+    target, _, udid = spec.partition(":")
+    return find_target(target), udid
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--device", action="append", default=[], help="config:udid of a phone to drive, config by id or name (repeatable)")
+    parser.add_argument("--fake", action="append", default=[],
+                        help="directory of screenshots played by a FakeDriver (repeatable)")
+    parser.add_argument("--target", type=find_target, default=13, help="config id or name for --fake sessions")
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (default: all cores)")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--server", default=APPIUM_SERVER_URL, help="Appium server URL")
+    args = parser.parse_args(argv)
+    if not args.device and not args.fake:
+        parser.error("give at least one --device or --fake")
+
+    sessions = []
+    for i, spec in enumerate(args.device):
+        target, udid = parse_device(spec)
+        sessions.append(make_session(target, udid or f"device{i}", device_id=udid,
+                                     wda_local_port=CONFIGS[target].wda_local_port + i))
+    for i, directory in enumerate(args.fake):
+        sessions.append(make_session(args.target, f"fake{i}", FakeDriver(directory, loop=True)))
+    setup_logging(sessions[0].config.log_level)
+
+    try:
+        for session in sessions:
+            if session.driver is None:
+                session.driver = connect_driver(session.config, args.server)
+        Supervisor(sessions, args.workers).run(args.duration)
+    finally:
+        for session in sessions:
+            if session.driver is not None:
+                session.driver.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+import json
+import logging
+import logging.handlers
+import os
+import random
+import threading
+import time
+
+# Upper bounds (seconds) of the stage latency histogram buckets.
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# The tracer auto_play reports to and the iteration being recorded, per thread: every
+# device session plays on its own thread, so stage helpers reach its loop through here.
+TELEMETRY = threading.local()
+
+
+def setup_logging(level="INFO"):
+    """Route the modules' log calls to stderr; 'WARNING' or above silences the per-loop chatter."""
+    logging.basicConfig(level=getattr(logging, str(level).upper()),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("iteration", "name", "start")
+
+    def __init__(self, iteration, name):
+        self.iteration = iteration
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.iteration.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Iteration:
+    """Stage timings and counters for one auto_play loop."""
+    __slots__ = ("number", "started", "stages", "counts", "values", "sampled")
+
+    def __init__(self, number, sampled):
+        self.number = number
+        self.started = time.time()
+        self.stages = {}  # stage -> [seconds, ...]
+        self.counts = {}
+        self.values = {}
+        self.sampled = sampled
+
+    def add_time(self, name, seconds):
+        durations = self.stages.get(name)
+        if durations is None:
+            self.stages[name] = [seconds]
+        else:
+            durations.append(seconds)
+
+    def span(self, name):
+        return _Span(self, name)
+
+    def count(self, name, amount=1):
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def set(self, name, value):
+        self.values[name] = value
+
+    def to_record(self):
+        return {
+            "iteration": self.number,
+            "ts": round(self.started, 3),
+            "stages_ms": {name: [round(s * 1000, 3) for s in durations] for name, durations in self.stages.items()},
+            "counts": self.counts,
+            "values": self.values,
+        }
+
+
+class Tracer:
+    """
+    Aggregates every iteration into Prometheus metrics and writes a JSONL trace line for a
+    sampled fraction of them. Metrics are rewritten at most every metrics_interval seconds.
+    """
+    def __init__(self, trace_path=None, metrics_path=None, sample_rate=1.0, max_bytes=5 * 1024 * 1024,
+                 backup_count=3, metrics_interval=10.0, prefix="bb_auto_play", labels=None):
+        self.sample_rate = sample_rate
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.prefix = prefix
+        # constant labels on every sample, e.g. {"device": ...} when several phones export
+        self.labels = "".join(f'{key}="{value}",' for key, value in sorted((labels or {}).items()))
+        self.iterations = 0
+        self.last_export = 0.0
+        self.stage_count = {}
+        self.stage_sum = {}
+        self.stage_buckets = {}
+        self.counters = {}
+        self.gauges = {}
+        self.trace = None
+        if trace_path:
+            directory = os.path.dirname(trace_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.trace = logging.getLogger(f"{__name__}.trace.{id(self)}")
+            self.trace.propagate = False
+            self.trace.setLevel(logging.INFO)
+            handler = logging.handlers.RotatingFileHandler(trace_path, maxBytes=max_bytes, backupCount=backup_count)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.trace.addHandler(handler)
+
+    def begin(self):
+        self.iterations += 1
+        sampled = self.trace is not None and (self.sample_rate >= 1 or random.random() < self.sample_rate)
+        iteration = Iteration(self.iterations, sampled)
+        TELEMETRY.iteration = iteration
+        return iteration
+
+    def end(self, iteration):
+        if getattr(TELEMETRY, "iteration", None) is iteration:
+            TELEMETRY.iteration = None
+        for name, durations in iteration.stages.items():
+            buckets = self.stage_buckets.setdefault(name, [0] * len(STAGE_BUCKETS))
+            for seconds in durations:
+                for i, bound in enumerate(STAGE_BUCKETS):
+                    if seconds <= bound:
+                        buckets[i] += 1
+            self.stage_count[name] = self.stage_count.get(name, 0) + len(durations)
+            self.stage_sum[name] = self.stage_sum.get(name, 0.0) + sum(durations)
+        for name, amount in iteration.counts.items():
+            self.counters[name] = self.counters.get(name, 0) + amount
+        for name, value in iteration.values.items():
+            if isinstance(value, (int, float)):
+                self.gauges[name] = value
+        self.counters["iterations"] = self.iterations
+
+        if iteration.sampled:
+            self.trace.info(json.dumps(iteration.to_record()))
+        now = time.monotonic()
+        if self.metrics_path and now - self.last_export >= self.metrics_interval:
+            self.export_metrics()
+            self.last_export = now
+
+    def export_metrics(self):
+        """Write the Prometheus text file atomically, as the node exporter textfile collector expects."""
+        p, labels = self.prefix, self.labels
+        plain = f"{{{labels[:-1]}}}" if labels else ""
+        lines = [f"# HELP {p}_stage_seconds Time spent per auto_play stage.",
+                 f"# TYPE {p}_stage_seconds histogram"]
+        for name in sorted(self.stage_count):
+            for bound, count in zip(STAGE_BUCKETS, self.stage_buckets[name]):
+                lines.append(f'{p}_stage_seconds_bucket{{{labels}stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'{p}_stage_seconds_bucket{{{labels}stage="{name}",le="+Inf"}} {self.stage_count[name]}')
+            lines.append(f'{p}_stage_seconds_sum{{{labels}stage="{name}"}} {self.stage_sum[name]:.6f}')
+            lines.append(f'{p}_stage_seconds_count{{{labels}stage="{name}"}} {self.stage_count[name]}')
+        for name in sorted(self.counters):
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total{plain} {self.counters[name]}")
+        for name in sorted(self.gauges):
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f"{p}_{name}{plain} {self.gauges[name]}")
+
+        directory = os.path.dirname(self.metrics_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.metrics_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, self.metrics_path)
+
+    def close(self):
+        if self.metrics_path:
+            self.export_metrics()
+        if self.trace is not None:
+            for handler in list(self.trace.handlers):
+                handler.close()
+                self.trace.removeHandler(handler)
+
+
+# --- Helpers for instrumented code; no-ops when no iteration is being recorded ---
+def span(name):
+    iteration = getattr(TELEMETRY, "iteration", None)
+    return NULL_SPAN if iteration is None else _Span(iteration, name)
+
+def count(name, amount=1):
+    iteration = getattr(TELEMETRY, "iteration", None)
+    if iteration is not None:
+        iteration.count(name, amount)
+
+def record(name, value):
+    iteration = getattr(TELEMETRY, "iteration", None)
+    if iteration is not None:
+        iteration.set(name, value)
+
+
+def start_tracer(cfg):
+    tracer = Tracer(cfg.trace_path, cfg.metrics_path, cfg.trace_sample_rate, cfg.trace_max_bytes,
+                    cfg.trace_backup_count, cfg.metrics_interval, labels=cfg.metrics_labels)
+    TELEMETRY.tracer = tracer
+    return tracer
+
+def stop_tracer():
+    tracer = getattr(TELEMETRY, "tracer", None)
+    if tracer is not None:
+        tracer.close()
+    TELEMETRY.tracer = None
+    TELEMETRY.iteration = None
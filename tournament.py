@@ -0,0 +1,155 @@
+"""
+Play seeded simulator games per strategy across a process pool and summarise them.
+
+    python tournament.py --games 200 --strategies greedy lookahead:time_budget=0.05
+
+Games are reproducible from their seeds; a lookahead limited by time_budget rather than
+node_budget can still vary with machine load.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from config import CONFIGS, find_target
+from placement import plan_greedy
+from simulator import Deck, Game, random_strategy
+from evaluation import make_leaf_eval
+from solver import default_leaf_eval, solve_tray
+
+
+# --- Strategies: name -> factory(**params) returning fn(board, shapes) -> moves ---
+def greedy_strategy(engine="python"):
+    return lambda board, shapes: plan_greedy(board, shapes, engine, verbose=False)
+
+def lookahead_strategy(node_budget=200000, time_budget=0.5, evaluation="cells"):
+    evaluate, leaf_upper = make_leaf_eval() if evaluation == "heuristic" else (default_leaf_eval, 0)
+
+    def strategy(board, shapes):
+        moves, _ = solve_tray(board, shapes, int(node_budget), float(time_budget), evaluate, leaf_upper,
+                              verbose=False)
+        return moves
+    return strategy
+
+STRATEGIES = {
+    "greedy": greedy_strategy,
+    "lookahead": lookahead_strategy,
+    "random": random_strategy,
+}
+# Strategies with their own RNG get the game seed, so results don't depend on sharding.
+SEEDED_STRATEGIES = {"random"}
+
+
+def parse_strategy(spec):
+    """'lookahead:time_budget=0.05,node_budget=20000' -> ('lookahead', {...})."""
+    name, _, args = spec.partition(":")
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {name!r}; choose from {', '.join(STRATEGIES)}")
+    params = {}
+    for item in filter(None, args.split(",")):
+        key, _, value = item.partition("=")
+        try:
+            params[key] = json.loads(value)
+        except ValueError:
+            params[key] = value
+    return name, params
+
+
+# --- Worker ---
+def play_shard(spec, seeds, max_moves, weights):
+    """Worker entry point: play one game per seed and time every strategy call."""
+    name, params = parse_strategy(spec)
+    deck = Deck(weights)
+    results = []
+    for seed in seeds:
+        strategy = STRATEGIES[name](**params, seed=seed) if name in SEEDED_STRATEGIES else STRATEGIES[name](**params)
+        timings = []
+
+        def timed(board, shapes):
+            start = time.perf_counter()
+            moves = strategy(board, shapes)
+            timings.append((time.perf_counter() - start, len(moves)))
+            return moves
+
+        result = Game(seed, deck).play(timed, max_moves)
+        result["seed"] = seed
+        result["solve_seconds"] = sum(seconds for seconds, _ in timings)
+        result["turn_ms"] = [round(seconds * 1000, 3) for seconds, _ in timings]
+        results.append(result)
+    return spec, results
+
+
+def run_tournament(specs, games, base_seed=0, workers=None, max_moves=None, weights=None):
+    """Every strategy plays the same seeds; each strategy's seeds are dealt round-robin over the workers."""
+    workers = workers or os.cpu_count() or 1
+    seeds = list(range(base_seed, base_seed + games))
+    shards = [seeds[i::workers] for i in range(min(workers, games))]
+    results = {spec: [] for spec in specs}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_shard, spec, shard, max_moves, weights) for spec in specs for shard in shards]
+        for future in futures:
+            spec, shard_results = future.result()
+            results[spec].extend(shard_results)
+    for spec in specs:
+        results[spec].sort(key=lambda r: r["seed"])
+    return results
+
+
+# --- Summary ---
+def summarize(results):
+    rows = []
+    for spec, games in results.items():
+        moves = sum(g["moves"] for g in games)
+        turns = sorted(ms for g in games for ms in g["turn_ms"])
+        rows.append({
+            "strategy": spec,
+            "games": len(games),
+            "avg_score": statistics.mean(g["score"] for g in games),
+            "median_score": statistics.median(g["score"] for g in games),
+            "avg_moves": statistics.mean(g["moves"] for g in games),
+            "ms_per_move": 1000 * sum(g["solve_seconds"] for g in games) / max(moves, 1),
+            "p95_turn_ms": turns[min(len(turns) - 1, int(len(turns) * 0.95))] if turns else 0.0,
+        })
+    return rows
+
+def print_summary(rows):
+    print(f"{'strategy':<36}{'games':>7}{'avg score':>11}{'median':>9}{'avg moves':>11}{'ms/move':>9}{'p95 turn ms':>13}")
+    for row in sorted(rows, key=lambda r: -r["avg_score"]):
+        print(f"{row['strategy']:<36}{row['games']:>7}{row['avg_score']:>11.1f}{row['median_score']:>9.1f}"
+              f"{row['avg_moves']:>11.1f}{row['ms_per_move']:>9.3f}{row['p95_turn_ms']:>13.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--strategies", nargs="+", default=["greedy", "lookahead:time_budget=0.05"],
+                        help=f"name[:key=value,...] with name in {', '.join(STRATEGIES)}")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="first game seed; games use seed .. seed+games-1")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--max-moves", type=int, default=None, help="stop long games after this many moves")
+    parser.add_argument("--target", type=find_target, default=None,
+                        help="config id or name whose sim_piece_weights to use")
+    parser.add_argument("--output", help="write per-game results and the summary as JSON")
+    args = parser.parse_args(argv)
+
+    for spec in args.strategies:
+        parse_strategy(spec)  # fail before starting the pool
+    weights = None
+    if args.target is not None:
+        weights = CONFIGS[args.target].sim_piece_weights
+
+    start = time.perf_counter()
+    results = run_tournament(args.strategies, args.games, args.seed, args.workers, args.max_moves, weights)
+    rows = summarize(results)
+    print_summary(rows)
+    print(f"{args.games} games x {len(args.strategies)} strategies in {time.perf_counter() - start:.1f}s")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"seed": args.seed, "games": args.games, "summary": rows, "results": results}, f)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import math
+import cv2
+from context import TemplateCache
+
+# Extra full-resolution pixels kept around each ROI in ROI-only mode, so the tray
+# preprocessing (3x3 blur, 19px adaptive threshold) sees the same neighbourhood.
+ROI_MARGIN = 16
+
+# Adaptive threshold window (px) of block_detection.preprocess_shape_image at full resolution.
+THRESHOLD_BLOCK = 19
+
+# Tray template matching stops finding thin outlines past this factor; it reads at this one instead.
+TEMPLATE_MAX_SCALE = 2
+
+# (config, vision settings, ROIs) -> VisionView, shared by every session using that config.
+VISION_VIEWS = {}
+
+
+def downscale(image, factor, smooth=False):
+    """
+    Every factor-th pixel for whole factors: a strided view, no copy and no filtering, which
+    suits readers that average over cell-sized windows anyway. Area resize for fractional
+    factors or when smooth (edge-based template matching needs the averaged outlines).
+    """
+    if factor == 1:
+        return image
+    if float(factor).is_integer() and not smooth:
+        return image[::int(factor), ::int(factor)]
+    h, w = image.shape[:2]
+    return cv2.resize(image, (max(1, round(w / factor)), max(1, round(h / factor))), interpolation=cv2.INTER_AREA)
+
+
+def roi_box(roi, factor=1, margin=ROI_MARGIN):
+    """
+    (x0, y0, x1, y1) of roi plus at least margin px per side. The origin sits a whole number
+    of factors before the ROI, so the ROI lands on whole pixels once scaled down by factor.
+    """
+    x, y, w, h = roi
+    f = int(math.ceil(factor))
+    margin = -(-margin // f) * f
+    x0, y0 = x - min(margin, x // f * f), y - min(margin, y // f * f)
+    return x0, y0, x + w + margin, y + h + margin
+
+
+class VisionView:
+    """
+    Where board and tray detection look: the frame (or just the ROIs plus a margin) scaled down
+    by cfg.vision_scale, with a config whose ROIs and cell geometry are scaled to match.
+    frame_origin/frame_factor on those configs map results back to screenshot pixels.
+    """
+    def __init__(self, cfg, factor=None):
+        self.factor = factor or cfg.vision_scale
+        self.roi_only = cfg.vision_roi_only
+        self.board_box = self.crop_box(cfg, cfg.board_roi)
+        self.tray_box = self.crop_box(cfg, cfg.block_roi)
+        self.board_config = self.scaled_config(cfg, self.board_box, "board")
+        self.tray_config = self.scaled_config(cfg, self.tray_box, "tray")
+        self.templates = TemplateCache()
+        # adaptive threshold window of the tray preprocessing, kept at the same screen size
+        self.threshold_block = max(3, int(round(THRESHOLD_BLOCK / self.factor)) | 1)
+        # the view the template tray reader uses
+        self.template_view = self if self.factor <= TEMPLATE_MAX_SCALE else VisionView(cfg, TEMPLATE_MAX_SCALE)
+
+    def crop_box(self, cfg, roi):
+        """(x0, y0, x1, y1) of the full-resolution region this view keeps for roi."""
+        if self.roi_only:
+            return roi_box(roi, self.factor)
+        f = int(math.ceil(self.factor))
+        return roi[0] % f, roi[1] % f, cfg.width, cfg.height
+
+    def scaled_config(self, cfg, box, part):
+        f = self.factor
+        ox, oy = box[:2]
+
+        def roi(r):
+            return ((r[0] - ox) / f, (r[1] - oy) / f, r[2] / f, r[3] / f)
+
+        attrs = {
+            "vision_scale": 1,
+            "vision_roi_only": False,
+            "frame_origin": (ox, oy),
+            "frame_factor": f,
+            "board_top_left": ((cfg.board_top_left[0] - ox) / f, (cfg.board_top_left[1] - oy) / f),
+            "board_roi": tuple(int(round(v)) for v in roi(cfg.board_roi)),
+            "block_roi": tuple(int(round(v)) for v in roi(cfg.block_roi)),
+            "block_size_on_board": cfg.block_size_on_board / f,
+            "board_grid_gap": cfg.board_grid_gap / f,
+            "tray_cell_size": cfg.tray_cell_size / f,
+            # never a denser lattice than full resolution samples
+            "tray_sample_step": max(1, int(math.ceil(cfg.tray_sample_step / f))),
+            "tray_sample_inset": cfg.tray_sample_inset / f,
+        }
+        return type(f"{cfg.__name__}_{part}_x{f}", (cfg,), attrs)
+
+    def crop(self, frame, box, smooth=False):
+        x0, y0, x1, y1 = box
+        return downscale(frame[y0:y1, x0:x1], self.factor, smooth)
+
+    def board_image(self, frame):
+        return self.crop(frame, self.board_box)
+
+    def tray_image(self, frame, smooth=False):
+        return self.crop(frame, self.tray_box, smooth)
+
+    def load_board_template(self, template_path):
+        from board_detection import prepare_board_template
+        template_img = cv2.imread(template_path)
+        if template_img is None:
+            raise FileNotFoundError(f"Could not load board template {template_path}")
+        return prepare_board_template(self.board_image(template_img), self.board_config.board_roi, self.board_config)
+
+    def load_block_template(self, template_path):
+        from block_detection import preprocess_shape_image
+        template = cv2.imread(template_path)
+        if template is None:
+            raise FileNotFoundError(f"Could not load block template {template_path}")
+        size = max(1, int(round(template.shape[1] / self.factor)))
+        return preprocess_shape_image(cv2.resize(template, (size, size), interpolation=cv2.INTER_AREA),
+                                      self.threshold_block)
+
+
+def get_vision_view(cfg):
+    """The VisionView for cfg, or None when detection runs on full-resolution frames."""
+    if cfg.vision_scale == 1 and not cfg.vision_roi_only:
+        return None
+    key = (cfg, cfg.vision_scale, cfg.vision_roi_only, tuple(cfg.board_roi), tuple(cfg.block_roi),
+           cfg.width, cfg.height)
+    view = VISION_VIEWS.get(key)
+    if view is None:
+        view = VISION_VIEWS[key] = VisionView(cfg)
+    return view